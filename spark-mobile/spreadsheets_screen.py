@@ -727,6 +727,13 @@ class SpreadsheetsScreen(BoxLayout):
 
                 # Apply formatting using Kivy markup if available
                 formatting = cell_formatting.get(cell_ref, {})
+                if isinstance(formatting, int):
+                    # Desktop stores formatting as a bitmask (1=bold, 2=italic, 4=underline)
+                    formatting = {
+                        'bold': bool(formatting & 1),
+                        'italic': bool(formatting & 2),
+                        'underline': bool(formatting & 4),
+                    }
                 markup_enabled = False
                 formatted_display = display_value
                 if formatting:
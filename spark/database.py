@@ -3,21 +3,126 @@
 import os
 import sqlite3
 import logging
+import threading
+from functools import wraps
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Union
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Durability traded for speed; applied only when SPARK_TEST=1 (test runs)
+TEST_PRAGMAS = (
+    'PRAGMA journal_mode=MEMORY',
+    'PRAGMA synchronous=OFF',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA locking_mode=EXCLUSIVE',
+    'PRAGMA cache_size=-20000',
+)
+
+# Full-text search indexes over notes and snippets. Contentless FTS5 tables in
+# the connection's TEMP schema, filled from the main tables when the connection
+# opens and kept in sync by TEMP triggers; refilled when another connection
+# (e.g. a Syncthing update) has changed the file. The trigram tokenizer gives
+# case-insensitive substring matches, the same results as the LIKE '%query%'
+# fallback.
+#
+# Nothing here is written to spark.db itself. The file is synced to
+# spark-mobile, whose SQLite may lack FTS5 or the trigram tokenizer (added in
+# 3.34), and FTS tables or triggers stored in the file would make every note
+# and snippet write there fail with "no such module". Each desktop connection
+# instead probes its own SQLite by creating the tables and falls back to LIKE.
+FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE temp.notes_fts USING fts5(title, content, content='', tokenize='trigram')",
+    '''CREATE TEMP TRIGGER notes_fts_insert AFTER INSERT ON main.notes BEGIN
+        INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END''',
+    '''CREATE TEMP TRIGGER notes_fts_delete AFTER DELETE ON main.notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END''',
+    '''CREATE TEMP TRIGGER notes_fts_update AFTER UPDATE OF title, content ON main.notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END''',
+    "CREATE VIRTUAL TABLE temp.snippets_fts USING fts5(title, code, tags, content='', tokenize='trigram')",
+    '''CREATE TEMP TRIGGER snippets_fts_insert AFTER INSERT ON main.snippets BEGIN
+        INSERT INTO snippets_fts(rowid, title, code, tags) VALUES (new.id, new.title, new.code, new.tags);
+    END''',
+    '''CREATE TEMP TRIGGER snippets_fts_delete AFTER DELETE ON main.snippets BEGIN
+        INSERT INTO snippets_fts(snippets_fts, rowid, title, code, tags)
+        VALUES ('delete', old.id, old.title, old.code, old.tags);
+    END''',
+    '''CREATE TEMP TRIGGER snippets_fts_update AFTER UPDATE OF title, code, tags ON main.snippets BEGIN
+        INSERT INTO snippets_fts(snippets_fts, rowid, title, code, tags)
+        VALUES ('delete', old.id, old.title, old.code, old.tags);
+        INSERT INTO snippets_fts(rowid, title, code, tags) VALUES (new.id, new.title, new.code, new.tags);
+    END''',
+)
+
+# (Re)fill the search index from the main tables
+FTS_FILL = (
+    "INSERT INTO notes_fts(notes_fts) VALUES ('delete-all')",
+    "INSERT INTO notes_fts(rowid, title, content) SELECT id, title, content FROM main.notes",
+    "INSERT INTO snippets_fts(snippets_fts) VALUES ('delete-all')",
+    "INSERT INTO snippets_fts(rowid, title, code, tags) SELECT id, title, code, tags FROM main.snippets",
+)
+
+# Search objects schema version 3 stored in the file; dropped on upgrade.
+# Triggers go first: they need no FTS5 to drop, and they are what breaks writes
+LEGACY_FTS_OBJECTS = (
+    'DROP TRIGGER IF EXISTS main.notes_fts_insert',
+    'DROP TRIGGER IF EXISTS main.notes_fts_delete',
+    'DROP TRIGGER IF EXISTS main.notes_fts_update',
+    'DROP TRIGGER IF EXISTS main.snippets_fts_insert',
+    'DROP TRIGGER IF EXISTS main.snippets_fts_delete',
+    'DROP TRIGGER IF EXISTS main.snippets_fts_update',
+    'DROP TABLE IF EXISTS main.notes_fts',
+    'DROP TABLE IF EXISTS main.snippets_fts',
+)
+
+# Trigram FTS needs at least this many characters to match anything
+FTS_MIN_QUERY_LENGTH = 3
+
+# Bump when init_database() gains new tables or indexes so existing files pick them up
+SCHEMA_VERSION = 4
+
+
+def _serialized(method):
+    """Run a Database method while holding its connection lock."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class Database:
-    """Manages SQLite database operations."""
+    """Manages SQLite database operations.
+
+    One connection is shared by the UI thread and the spreadsheet save
+    worker; every method that touches it holds self._lock, so statements
+    and their commit never interleave with another thread's.
+    """
+
+    def __init__(self, db_path: Union[Path, str], on_save_callback=None):
+        """Open the database at db_path.
 
-    def __init__(self, db_path: Path, on_save_callback=None):
+        db_path is a filesystem path, or an SQLite URI string such as
+        "file:name?mode=memory&cache=shared" (or ":memory:") for a database
+        that never touches disk.
+        """
         logger.info(f"Initializing database at: {db_path}")
-        self.db_path = db_path
+        self.is_uri = isinstance(db_path, str) and (db_path.startswith('file:') or db_path == ':memory:')
+        self.db_path = db_path if self.is_uri else Path(db_path)
         self.connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._schema_ready = False
+        self._has_fts = False
+        self._indexed_version = None  # PRAGMA data_version the search index was filled at
         self.on_save_callback = on_save_callback  # Callback to notify before saving
+        self._now = datetime.now  # Clock for modified_at; tests can swap it out
         try:
             self.init_database()
             logger.info("Database initialization complete")
@@ -30,30 +135,53 @@ class Database:
         if self.on_save_callback:
             self.on_save_callback()
 
+    @_serialized
     def connect(self):
         """Establish database connection."""
         if not self.connection:
-            # Check if database file is new (doesn't exist yet)
-            is_new_db = not self.db_path.exists()
-            logger.debug(f"Connecting to database (new={is_new_db})")
-
-            try:
-                self.connection = sqlite3.connect(str(self.db_path))
-                self.connection.row_factory = sqlite3.Row
-                logger.debug("Database connection established")
-
-                # Set restrictive permissions on new database file
-                if is_new_db:
-                    try:
-                        os.chmod(self.db_path, 0o600)
-                        logger.debug("Set database file permissions to 0600")
-                    except OSError as e:
-                        logger.warning(f"Could not set database permissions: {e}")
-            except Exception as e:
-                logger.error(f"Failed to connect to database: {e}", exc_info=True)
-                raise
+            if self.is_uri:
+                # URI databases (e.g. in-memory) have no file to create or chmod
+                logger.debug(f"Connecting to database URI: {self.db_path}")
+                self.connection = sqlite3.connect(self.db_path, uri=True, check_same_thread=False)
+            else:
+                self._connect_file()
+
+            # Getters hand these Rows straight to callers, which index them by column name
+            self.connection.row_factory = sqlite3.Row
+
+            if os.environ.get('SPARK_TEST', '0') == '1':
+                for pragma in TEST_PRAGMAS:
+                    self.connection.execute(pragma)
+
+            # The search index is per connection, so a reconnect (e.g. after a
+            # sync reload) rebuilds it; before the schema exists, init_database does
+            if self._schema_ready:
+                self._has_fts = self._init_search_index(self.connection.cursor())
         return self.connection
 
+    def _connect_file(self):
+        """Open the database file, restricting permissions if it is new."""
+        # Check if database file is new (doesn't exist yet)
+        is_new_db = not self.db_path.exists()
+        logger.debug(f"Connecting to database (new={is_new_db})")
+
+        try:
+            # Spreadsheet saves are written from a background worker thread
+            self.connection = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            logger.debug("Database connection established")
+
+            # Set restrictive permissions on new database file
+            if is_new_db:
+                try:
+                    os.chmod(self.db_path, 0o600)
+                    logger.debug("Set database file permissions to 0600")
+                except OSError as e:
+                    logger.warning(f"Could not set database permissions: {e}")
+        except Exception as e:
+            logger.error(f"Failed to connect to database: {e}", exc_info=True)
+            raise
+
+    @_serialized
     def close(self):
         """Close database connection."""
         if self.connection:
@@ -61,11 +189,22 @@ class Database:
             self.connection.close()
             self.connection = None
 
+    @_serialized
     def init_database(self):
         """Initialize database schema."""
+        if self._schema_ready:
+            return
         conn = self.connect()
         cursor = conn.cursor()
 
+        # Files already stamped with the current schema version need no DDL
+        cursor.execute('PRAGMA user_version')
+        if cursor.fetchone()[0] >= SCHEMA_VERSION:
+            # The version says nothing about this SQLite's FTS5 support, so probe anyway
+            self._has_fts = self._init_search_index(cursor)
+            self._schema_ready = True
+            return
+
         # Notes table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS notes (
@@ -108,15 +247,85 @@ class Database:
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_snippets_title ON snippets(title)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_snippets_language ON snippets(language)')
 
+        # Indexes matching the tree/listing queries, so they range-scan in order
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_parent_title ON notes(parent_id, title)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_snippets_language_title ON snippets(language, title)')
+
+        self._drop_legacy_search_index(cursor)
+
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         conn.commit()
+        self._has_fts = self._init_search_index(cursor)
+        self._schema_ready = True
+
+    def _drop_legacy_search_index(self, cursor: sqlite3.Cursor):
+        """Remove the FTS tables and triggers older versions stored in the file."""
+        for statement in LEGACY_FTS_OBJECTS:
+            try:
+                cursor.execute(statement)
+            except sqlite3.OperationalError as e:
+                # Dropping an FTS5 table needs FTS5; with the triggers gone the
+                # leftover table is only dead weight
+                logger.warning(f"Could not drop old search index: {e}")
+
+    def _init_search_index(self, cursor: sqlite3.Cursor) -> bool:
+        """Build this connection's TEMP search index.
+
+        Returns False, leaving searches on LIKE, if this SQLite lacks FTS5 or
+        the trigram tokenizer.
+        """
+        try:
+            cursor.execute('SAVEPOINT fts_schema')
+            for statement in FTS_SCHEMA:
+                cursor.execute(statement)
+            cursor.execute('RELEASE fts_schema')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Full-text search unavailable, falling back to LIKE: {e}")
+            cursor.execute('ROLLBACK TO fts_schema')
+            cursor.execute('RELEASE fts_schema')
+            return False
+        self._fill_search_index(cursor)
+        return True
+
+    def _fill_search_index(self, cursor: sqlite3.Cursor):
+        """Refill the search index from the main tables."""
+        cursor.execute('SAVEPOINT fts_fill')
+        for statement in FTS_FILL:
+            cursor.execute(statement)
+        cursor.execute('RELEASE fts_fill')
+        cursor.execute('PRAGMA data_version')
+        self._indexed_version = cursor.fetchone()[0]
+
+    def _sync_search_index(self, cursor: sqlite3.Cursor):
+        """Refill the search index if another connection has changed the file.
+
+        Called before searching, so results match the file, and before writes
+        to notes or snippets, whose triggers must remove exactly the values
+        that were indexed.
+        """
+        if not self._has_fts:
+            return
+        cursor.execute('PRAGMA data_version')
+        if cursor.fetchone()[0] != self._indexed_version:
+            logger.debug("Database changed by another connection, refilling search index")
+            self._fill_search_index(cursor)
+
+    def _fts_match(self, query: str) -> Optional[str]:
+        """Build an FTS5 MATCH expression for query, or None to use LIKE instead."""
+        if not self._has_fts or len(query) < FTS_MIN_QUERY_LENGTH:
+            return None
+        # Quote as a single phrase so FTS5 query syntax in user input is literal text
+        return '"' + query.replace('"', '""') + '"'
 
     # Notes operations
+    @_serialized
     def add_note(self, title: str, content: str = "", parent_id: Optional[int] = None) -> int:
         """Add a new note."""
         logger.info(f"Adding note: title='{title[:50]}...', parent_id={parent_id}, content_len={len(content)}")
         try:
             conn = self.connect()
             cursor = conn.cursor()
+            self._sync_search_index(cursor)
             cursor.execute(
                 'INSERT INTO notes (title, content, parent_id) VALUES (?, ?, ?)',
                 (title, content, parent_id)
@@ -130,15 +339,37 @@ class Database:
             logger.error(f"Failed to add note: {e}", exc_info=True)
             raise
 
+    @_serialized
+    def bulk_add_notes(self, rows: List[Tuple[str, str, Optional[int]]]) -> int:
+        """Add several notes, given as (title, content, parent_id) rows, in one transaction."""
+        logger.info(f"Adding {len(rows)} notes in bulk")
+        try:
+            conn = self.connect()
+            cursor = conn.cursor()
+            self._sync_search_index(cursor)
+            cursor.executemany(
+                'INSERT INTO notes (title, content, parent_id) VALUES (?, ?, ?)',
+                rows
+            )
+            self._before_commit()
+            conn.commit()
+            logger.info(f"Bulk added {cursor.rowcount} notes")
+            return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Failed to bulk add notes: {e}", exc_info=True)
+            raise
+
+    @_serialized
     def update_note(self, note_id: int, title: str, content: str):
         """Update an existing note."""
         logger.info(f"Updating note id={note_id}, title='{title[:50]}...', content_len={len(content)}")
         try:
             conn = self.connect()
             cursor = conn.cursor()
+            self._sync_search_index(cursor)
             cursor.execute(
                 'UPDATE notes SET title = ?, content = ?, modified_at = ? WHERE id = ?',
-                (title, content, datetime.now(), note_id)
+                (title, content, self._now(), note_id)
             )
             self._before_commit()
             conn.commit()
@@ -147,6 +378,7 @@ class Database:
             logger.error(f"Failed to update note {note_id}: {e}", exc_info=True)
             raise
 
+    @_serialized
     def update_note_parent(self, note_id: int, new_parent_id: Optional[int]):
         """Update a note's parent_id."""
         logger.info(f"Updating note id={note_id} parent to {new_parent_id}")
@@ -165,7 +397,7 @@ class Database:
 
             cursor.execute(
                 'UPDATE notes SET parent_id = ?, modified_at = ? WHERE id = ?',
-                (new_parent_id, datetime.now(), note_id)
+                (new_parent_id, self._now(), note_id)
             )
             self._before_commit()
             conn.commit()
@@ -196,12 +428,14 @@ class Database:
 
         return False
 
+    @_serialized
     def delete_note(self, note_id: int):
         """Delete a note and its children."""
         logger.info(f"Deleting note id={note_id}")
         try:
             conn = self.connect()
             cursor = conn.cursor()
+            self._sync_search_index(cursor)
             cursor.execute('DELETE FROM notes WHERE id = ?', (note_id,))
             self._before_commit()
             conn.commit()
@@ -210,6 +444,7 @@ class Database:
             logger.error(f"Failed to delete note {note_id}: {e}", exc_info=True)
             raise
 
+    @_serialized
     def get_note(self, note_id: int) -> Optional[sqlite3.Row]:
         """Get a note by ID."""
         conn = self.connect()
@@ -217,6 +452,7 @@ class Database:
         cursor.execute('SELECT * FROM notes WHERE id = ?', (note_id,))
         return cursor.fetchone()
 
+    @_serialized
     def get_all_notes(self) -> List[sqlite3.Row]:
         """Get all notes."""
         conn = self.connect()
@@ -224,6 +460,7 @@ class Database:
         cursor.execute('SELECT * FROM notes ORDER BY parent_id, title')
         return cursor.fetchall()
 
+    @_serialized
     def get_root_notes(self) -> List[sqlite3.Row]:
         """Get all root-level notes."""
         conn = self.connect()
@@ -231,6 +468,7 @@ class Database:
         cursor.execute('SELECT * FROM notes WHERE parent_id IS NULL ORDER BY title')
         return cursor.fetchall()
 
+    @_serialized
     def get_child_notes(self, parent_id: int) -> List[sqlite3.Row]:
         """Get child notes of a parent."""
         conn = self.connect()
@@ -238,10 +476,23 @@ class Database:
         cursor.execute('SELECT * FROM notes WHERE parent_id = ? ORDER BY title', (parent_id,))
         return cursor.fetchall()
 
+    @_serialized
     def search_notes(self, query: str) -> List[sqlite3.Row]:
         """Search notes by title or content."""
+        # A blank query matches nothing; don't scan the tables to find that out
+        if not query or query.isspace():
+            return []
         conn = self.connect()
         cursor = conn.cursor()
+        match = self._fts_match(query)
+        if match is not None:
+            self._sync_search_index(cursor)
+            cursor.execute(
+                'SELECT * FROM notes WHERE id IN '
+                '(SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?) ORDER BY modified_at DESC',
+                (match,)
+            )
+            return cursor.fetchall()
         search_pattern = f'%{query}%'
         cursor.execute(
             'SELECT * FROM notes WHERE title LIKE ? OR content LIKE ? ORDER BY modified_at DESC',
@@ -250,6 +501,7 @@ class Database:
         return cursor.fetchall()
 
     # Spreadsheet operations
+    @_serialized
     def add_spreadsheet(self, name: str, data: str = "{}") -> int:
         """Add a new spreadsheet."""
         conn = self.connect()
@@ -262,17 +514,19 @@ class Database:
         conn.commit()
         return cursor.lastrowid
 
+    @_serialized
     def update_spreadsheet(self, sheet_id: int, name: str, data: str):
         """Update an existing spreadsheet."""
         conn = self.connect()
         cursor = conn.cursor()
         cursor.execute(
             'UPDATE spreadsheets SET name = ?, data = ?, modified_at = ? WHERE id = ?',
-            (name, data, datetime.now(), sheet_id)
+            (name, data, self._now(), sheet_id)
         )
         self._before_commit()
         conn.commit()
 
+    @_serialized
     def delete_spreadsheet(self, sheet_id: int):
         """Delete a spreadsheet."""
         conn = self.connect()
@@ -281,6 +535,7 @@ class Database:
         self._before_commit()
         conn.commit()
 
+    @_serialized
     def get_spreadsheet(self, sheet_id: int) -> Optional[sqlite3.Row]:
         """Get a spreadsheet by ID."""
         conn = self.connect()
@@ -288,6 +543,7 @@ class Database:
         cursor.execute('SELECT * FROM spreadsheets WHERE id = ?', (sheet_id,))
         return cursor.fetchone()
 
+    @_serialized
     def get_all_spreadsheets(self) -> List[sqlite3.Row]:
         """Get all spreadsheets."""
         conn = self.connect()
@@ -296,10 +552,12 @@ class Database:
         return cursor.fetchall()
 
     # Snippet operations
+    @_serialized
     def add_snippet(self, title: str, code: str = "", language: str = "", tags: str = "") -> int:
         """Add a new code snippet."""
         conn = self.connect()
         cursor = conn.cursor()
+        self._sync_search_index(cursor)
         cursor.execute(
             'INSERT INTO snippets (title, code, language, tags) VALUES (?, ?, ?, ?)',
             (title, code, language, tags)
@@ -308,25 +566,44 @@ class Database:
         conn.commit()
         return cursor.lastrowid
 
+    @_serialized
+    def bulk_add_snippets(self, rows: List[Tuple[str, str, str, str]]) -> int:
+        """Add several snippets, given as (title, code, language, tags) rows, in one transaction."""
+        conn = self.connect()
+        cursor = conn.cursor()
+        self._sync_search_index(cursor)
+        cursor.executemany(
+            'INSERT INTO snippets (title, code, language, tags) VALUES (?, ?, ?, ?)',
+            rows
+        )
+        self._before_commit()
+        conn.commit()
+        return cursor.rowcount
+
+    @_serialized
     def update_snippet(self, snippet_id: int, title: str, code: str, language: str, tags: str):
         """Update an existing snippet."""
         conn = self.connect()
         cursor = conn.cursor()
+        self._sync_search_index(cursor)
         cursor.execute(
             'UPDATE snippets SET title = ?, code = ?, language = ?, tags = ?, modified_at = ? WHERE id = ?',
-            (title, code, language, tags, datetime.now(), snippet_id)
+            (title, code, language, tags, self._now(), snippet_id)
         )
         self._before_commit()
         conn.commit()
 
+    @_serialized
     def delete_snippet(self, snippet_id: int):
         """Delete a snippet."""
         conn = self.connect()
         cursor = conn.cursor()
+        self._sync_search_index(cursor)
         cursor.execute('DELETE FROM snippets WHERE id = ?', (snippet_id,))
         self._before_commit()
         conn.commit()
 
+    @_serialized
     def get_snippet(self, snippet_id: int) -> Optional[sqlite3.Row]:
         """Get a snippet by ID."""
         conn = self.connect()
@@ -334,6 +611,7 @@ class Database:
         cursor.execute('SELECT * FROM snippets WHERE id = ?', (snippet_id,))
         return cursor.fetchone()
 
+    @_serialized
     def get_all_snippets(self) -> List[sqlite3.Row]:
         """Get all snippets."""
         conn = self.connect()
@@ -341,6 +619,7 @@ class Database:
         cursor.execute('SELECT * FROM snippets ORDER BY language, title')
         return cursor.fetchall()
 
+    @_serialized
     def get_snippets_by_language(self, language: str) -> List[sqlite3.Row]:
         """Get snippets by language."""
         conn = self.connect()
@@ -348,10 +627,23 @@ class Database:
         cursor.execute('SELECT * FROM snippets WHERE language = ? ORDER BY title', (language,))
         return cursor.fetchall()
 
+    @_serialized
     def search_snippets(self, query: str) -> List[sqlite3.Row]:
         """Search snippets by title, code, or tags."""
+        # A blank query matches nothing; don't scan the tables to find that out
+        if not query or query.isspace():
+            return []
         conn = self.connect()
         cursor = conn.cursor()
+        match = self._fts_match(query)
+        if match is not None:
+            self._sync_search_index(cursor)
+            cursor.execute(
+                'SELECT * FROM snippets WHERE id IN '
+                '(SELECT rowid FROM snippets_fts WHERE snippets_fts MATCH ?) ORDER BY modified_at DESC',
+                (match,)
+            )
+            return cursor.fetchall()
         search_pattern = f'%{query}%'
         cursor.execute(
             'SELECT * FROM snippets WHERE title LIKE ? OR code LIKE ? OR tags LIKE ? ORDER BY modified_at DESC',
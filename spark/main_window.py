@@ -6,7 +6,7 @@ from PyQt6.QtWidgets import (
     QLineEdit, QVBoxLayout, QWidget, QMessageBox, QDialog,
     QLabel, QComboBox, QPushButton, QHBoxLayout, QApplication
 )
-from PyQt6.QtCore import Qt, QTimer, QFileSystemWatcher
+from PyQt6.QtCore import Qt, QTimer, QFileSystemWatcher, pyqtSignal
 from PyQt6.QtGui import QAction, QKeySequence, QIcon
 from pathlib import Path
 from spark.notes_widget import NotesWidget
@@ -106,13 +106,18 @@ class SettingsDialog(QDialog):
 class MainWindow(QMainWindow):
     """Main application window."""
 
+    # Emitted by Database before each commit, possibly from the sheet save
+    # worker; the auto connection queues on_database_save onto the UI thread
+    database_saving = pyqtSignal()
+
     def __init__(self, database, config):
         super().__init__()
         self.database = database
         self.config = config
 
         # Set database save callback to ignore self-initiated changes
-        self.database.on_save_callback = self.on_database_save
+        self.database_saving.connect(self.on_database_save)
+        self.database.on_save_callback = self.database_saving.emit
 
         self.setWindowTitle("SPARK Personal - Snippet, Personal Archive, and Reference Keeper")
 
@@ -450,6 +455,7 @@ class MainWindow(QMainWindow):
 
             if hasattr(self.spreadsheet_widget, 'is_modified') and self.spreadsheet_widget.is_modified:
                 self.spreadsheet_widget.save_current_sheet()
+            self.spreadsheet_widget.wait_for_pending_saves()
 
             if hasattr(self.snippets_widget, 'is_modified') and self.snippets_widget.is_modified:
                 self.snippets_widget.save_current_snippet()
@@ -489,6 +495,8 @@ class MainWindow(QMainWindow):
 
         if hasattr(self.spreadsheet_widget, 'is_modified') and self.spreadsheet_widget.is_modified:
             self.spreadsheet_widget.save_current_sheet()
+        # Sheet saves run in the background; finish them before the database closes
+        self.spreadsheet_widget.wait_for_pending_saves()
 
         if hasattr(self.snippets_widget, 'is_modified') and self.snippets_widget.is_modified:
             self.snippets_widget.save_current_snippet()
@@ -1298,7 +1298,7 @@ class NotesWidget(QWidget):
 
     def search(self, query: str):
         """Search notes and highlight results."""
-        if not query:
+        if not query.strip():
             self.load_notes()
             return
 
@@ -344,7 +344,7 @@ p {{
 
     def search(self, query: str):
         """Search snippets."""
-        if not query:
+        if not query.strip():
             self.load_snippets()
             return
 
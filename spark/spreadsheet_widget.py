@@ -1,19 +1,124 @@
 """Spreadsheet widget with formula engine."""
 
 import json
+import logging
 import re
 import ast
 import operator
 import math
-from datetime import datetime
+import sys
+import time
+from collections import deque
+from functools import lru_cache, partial
+from types import MappingProxyType
+from datetime import datetime, timedelta
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
     QPushButton, QLineEdit, QListWidget, QSplitter, QInputDialog,
     QMessageBox, QHeaderView, QMenu, QAbstractItemView, QLabel
 )
-from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtCore import (
+    Qt, QTimer, pyqtSignal, QObject, QRunnable, QThreadPool, QCoreApplication, QEvent
+)
 from PyQt6.QtGui import QAction, QKeyEvent, QFont
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Iterable, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Cell formatting flags, persisted as a bitmask in the sheet's 'cell_formatting' map
+FORMAT_BOLD = 1
+FORMAT_ITALIC = 2
+FORMAT_UNDERLINE = 4
+
+# Precompiled FormulaEngine patterns
+_EQUALS_RE = re.compile(r'(?<![=!<>])=(?!=)')  # = not preceded by =!<> and not followed by =
+_CELL_REF_RE = re.compile(r'\b([A-Z]+)(\d+)\b')
+_CELL_ARG_RE = re.compile(r'^[A-Z]+\d+$')
+_RANGE_RE = re.compile(r'([A-Z]+)(\d+):([A-Z]+)(\d+)')
+_PI_CALL_RE = re.compile(r'\bPI\(\)', re.IGNORECASE)
+_PI_RE = re.compile(r'\bPI\b', re.IGNORECASE)
+_E_CALL_RE = re.compile(r'\bE\(\)', re.IGNORECASE)
+_E_RE = re.compile(r'\bE\b', re.IGNORECASE)
+_TODAY_RE = re.compile(r'TODAY\(\)', re.IGNORECASE)
+_NOW_RE = re.compile(r'NOW\(\)', re.IGNORECASE)
+_SUM_RE = re.compile(r'SUM\((.*?)\)', re.IGNORECASE)
+_AVERAGE_RE = re.compile(r'AVERAGE\((.*?)\)', re.IGNORECASE)
+_IF_RE = re.compile(r'IF\((.*?),(.*?),(.*?)\)', re.IGNORECASE)
+_DATE_RE = re.compile(r'DATE\((.*?)\)', re.IGNORECASE)
+_TIME_RE = re.compile(r'TIME\((.*?)\)', re.IGNORECASE)
+_MIN_RE = re.compile(r'MIN\((.*?)\)', re.IGNORECASE)
+_MAX_RE = re.compile(r'MAX\((.*?)\)', re.IGNORECASE)
+_COUNT_RE = re.compile(r'COUNT\((.*?)\)', re.IGNORECASE)
+_MEDIAN_RE = re.compile(r'MEDIAN\((.*?)\)', re.IGNORECASE)
+_MOD_RE = re.compile(r'MOD\((.*?),(.*?)\)', re.IGNORECASE)
+_FLOOR_RE = re.compile(r'FLOOR\((.*?)\)', re.IGNORECASE)
+_CEILING_RE = re.compile(r'CEILING\((.*?)\)', re.IGNORECASE)
+_CEIL_RE = re.compile(r'CEIL\((.*?)\)', re.IGNORECASE)
+_ABS_RE = re.compile(r'ABS\((.*?)\)', re.IGNORECASE)
+_ROUND_RE = re.compile(r'ROUND\((.*?)\)', re.IGNORECASE)
+_SQRT_RE = re.compile(r'SQRT\((.*?)\)', re.IGNORECASE)
+_POWER_RE = re.compile(r'POWER\((.*?)\)', re.IGNORECASE)
+_POW_RE = re.compile(r'POW\((.*?)\)', re.IGNORECASE)
+_VOLATILE_RE = re.compile(r'\b(?:TODAY|NOW)\(', re.IGNORECASE)
+_NOT_RE = re.compile(r'\bNOT\((.*?)\)', re.IGNORECASE)
+_AND_RE = re.compile(r'\bAND\((.*?)\)', re.IGNORECASE)
+_OR_RE = re.compile(r'\bOR\((.*?)\)', re.IGNORECASE)
+
+
+# Variables for plain evaluate(): expressions there may only use constants
+_NO_VARIABLES: Mapping[str, Any] = MappingProxyType({})
+
+
+def _real(value: Any) -> Any:
+    """Reject a complex result, e.g. from a negative number to a fractional power."""
+    if isinstance(value, complex):
+        raise ValueError("math domain error")
+    return value
+
+
+def _check_expression(node: ast.AST, allow_variables: bool):
+    """Raise ValueError if any part of an expression is unsupported.
+
+    The whole tree is checked, including the side of "and"/"or" that
+    evaluation may skip. Names other than the math constants are only
+    allowed as variables when allow_variables is set. Operators are
+    checked as each node is compiled.
+    """
+    callees = set()
+    for child in ast.walk(node):
+        if isinstance(child, _OPERATOR_NODES):
+            continue
+        node_type = type(child)
+        if node_type not in _EXPRESSION_NODES:
+            raise ValueError(f"Unsupported expression type: {node_type.__name__}")
+        if node_type is ast.Call:
+            func = child.func
+            if not isinstance(func, ast.Name):
+                raise ValueError(f"Unsupported function call type: {type(func).__name__}")
+            if func.id not in SafeExpressionEvaluator.MATH_FUNCTIONS:
+                raise ValueError(f"Unknown or unsafe function: {func.id}")
+            callees.add(func)
+        elif node_type is ast.Name and child not in callees:
+            if not allow_variables and child.id not in SafeExpressionEvaluator.MATH_CONSTANTS:
+                raise ValueError(f"Unknown constant or variable: {child.id}")
+
+
+@lru_cache(maxsize=4096)
+def _compile_expression(expr: str, allow_variables: bool = False) -> Callable[[Mapping[str, Any]], Any]:
+    """Parse and compile an expression once; recalculation re-evaluates the same text repeatedly."""
+    node = ast.parse(expr, mode='eval').body
+    _check_expression(node, allow_variables)
+    run = SafeExpressionEvaluator._compile_node(node)
+    # Expressions only combine literals, named constants, pure math functions
+    # and variables. One that evaluates cleanly without any variables never
+    # reads them, so it always gives the same value: fold it down to that
+    # value. Anything else keeps its closure, so variables are looked up and
+    # errors raised again on every evaluation.
+    try:
+        value = run(_NO_VARIABLES)
+    except Exception:
+        return run
+    return lambda variables: value
 
 
 class SafeExpressionEvaluator:
@@ -83,97 +188,507 @@ class SafeExpressionEvaluator:
     def evaluate(expr: str) -> Any:
         """Safely evaluate a mathematical expression."""
         try:
-            node = ast.parse(expr, mode='eval').body
-            return SafeExpressionEvaluator._eval_node(node)
+            return _real(_compile_expression(expr)(_NO_VARIABLES))
+        except Exception as e:
+            raise ValueError(f"Invalid expression: {str(e)}")
+
+    @staticmethod
+    def evaluate_many(expr: str, rows: Iterable[Mapping[str, Any]]) -> list:
+        """Evaluate one expression against several sets of variable values.
+
+        The expression is compiled once; names other than the math constants
+        are looked up in each row. Raises ValueError like evaluate() for the
+        first row that fails.
+        """
+        try:
+            run = _compile_expression(expr, True)
+            return [_real(run(row)) for row in rows]
         except Exception as e:
             raise ValueError(f"Invalid expression: {str(e)}")
 
     @staticmethod
-    def _eval_node(node):
-        """Recursively evaluate AST nodes."""
-        if isinstance(node, ast.Constant):  # Python 3.8+
-            return node.value
-        elif isinstance(node, ast.Num):  # Legacy support
-            return node.n
-        elif isinstance(node, ast.Str):  # Legacy support
-            return node.s
-        elif isinstance(node, ast.UnaryOp):
-            op = SafeExpressionEvaluator.OPERATORS.get(type(node.op))
-            if op is None:
-                raise ValueError(f"Unsupported unary operator: {type(node.op).__name__}")
-            operand = SafeExpressionEvaluator._eval_node(node.operand)
-            return op(operand)
-        elif isinstance(node, ast.BinOp):
-            op = SafeExpressionEvaluator.OPERATORS.get(type(node.op))
-            if op is None:
-                raise ValueError(f"Unsupported binary operator: {type(node.op).__name__}")
-            left = SafeExpressionEvaluator._eval_node(node.left)
-            right = SafeExpressionEvaluator._eval_node(node.right)
-            return op(left, right)
-        elif isinstance(node, ast.Compare):
-            if len(node.ops) != 1:
-                raise ValueError("Chained comparisons not supported")
-            op = SafeExpressionEvaluator.COMPARISONS.get(type(node.ops[0]))
-            if op is None:
-                raise ValueError(f"Unsupported comparison: {type(node.ops[0]).__name__}")
-            left = SafeExpressionEvaluator._eval_node(node.left)
-            right = SafeExpressionEvaluator._eval_node(node.comparators[0])
-            return op(left, right)
-        elif isinstance(node, ast.BoolOp):
-            op = SafeExpressionEvaluator.BOOL_OPS.get(type(node.op))
-            if op is None:
-                raise ValueError(f"Unsupported boolean operator: {type(node.op).__name__}")
-            values = [SafeExpressionEvaluator._eval_node(v) for v in node.values]
-            result = values[0]
-            for val in values[1:]:
-                result = op(result, val)
+    def _compile_node(node) -> Callable[[Mapping[str, Any]], Any]:
+        """Turn an AST node into a closure that evaluates it for a mapping of variables.
+
+        Operators and functions are looked up once here instead of on every
+        evaluation. Anything unsupported raises ValueError here, before the
+        expression is ever evaluated.
+        """
+        compiler = SafeExpressionEvaluator._COMPILERS.get(type(node))
+        if compiler is None:
+            raise ValueError(f"Unsupported expression type: {type(node).__name__}")
+        return compiler(node)
+
+    @staticmethod
+    def _compile_constant(node):
+        value = node.value
+        return lambda variables: value
+
+    @staticmethod
+    def _compile_unaryop(node):
+        op = SafeExpressionEvaluator.OPERATORS.get(type(node.op))
+        if op is None:
+            raise ValueError(f"Unsupported unary operator: {type(node.op).__name__}")
+        operand = SafeExpressionEvaluator._compile_node(node.operand)
+        return lambda variables: op(operand(variables))
+
+    @staticmethod
+    def _compile_binop(node):
+        op = SafeExpressionEvaluator.OPERATORS.get(type(node.op))
+        if op is None:
+            raise ValueError(f"Unsupported binary operator: {type(node.op).__name__}")
+        left = SafeExpressionEvaluator._compile_node(node.left)
+        right = SafeExpressionEvaluator._compile_node(node.right)
+        return lambda variables: op(left(variables), right(variables))
+
+    @staticmethod
+    def _compile_compare(node):
+        if len(node.ops) != 1:
+            raise ValueError("Chained comparisons not supported")
+        op = SafeExpressionEvaluator.COMPARISONS.get(type(node.ops[0]))
+        if op is None:
+            raise ValueError(f"Unsupported comparison: {type(node.ops[0]).__name__}")
+        left = SafeExpressionEvaluator._compile_node(node.left)
+        right = SafeExpressionEvaluator._compile_node(node.comparators[0])
+        return lambda variables: op(left(variables), right(variables))
+
+    @staticmethod
+    def _compile_boolop(node):
+        op_type = type(node.op)
+        if op_type not in SafeExpressionEvaluator.BOOL_OPS:
+            raise ValueError(f"Unsupported boolean operator: {op_type.__name__}")
+        values = [SafeExpressionEvaluator._compile_node(value) for value in node.values]
+        # Short-circuit like Python: stop at the first false (and) or true (or) value.
+        # Two operands is the usual case, and Python's own operators do that directly.
+        if len(values) == 2:
+            left, right = values
+            if op_type is ast.And:
+                return lambda variables: left(variables) and right(variables)
+            return lambda variables: left(variables) or right(variables)
+        stop_on = op_type is ast.Or
+
+        def run(variables):
+            for value in values:
+                result = value(variables)
+                if bool(result) is stop_on:
+                    break
             return result
-        elif isinstance(node, ast.NameConstant):  # True, False, None (Python 3.7)
-            return node.value
-        elif isinstance(node, ast.Call):
-            # Handle function calls
-            if isinstance(node.func, ast.Name):
-                func_name = node.func.id
-                if func_name in SafeExpressionEvaluator.MATH_FUNCTIONS:
-                    func = SafeExpressionEvaluator.MATH_FUNCTIONS[func_name]
-                    args = [SafeExpressionEvaluator._eval_node(arg) for arg in node.args]
-                    return func(*args)
-                else:
-                    raise ValueError(f"Unknown or unsafe function: {func_name}")
-            else:
-                raise ValueError(f"Unsupported function call type: {type(node.func).__name__}")
-        elif isinstance(node, ast.Name):
-            # Handle named constants
-            if node.id in SafeExpressionEvaluator.MATH_CONSTANTS:
-                return SafeExpressionEvaluator.MATH_CONSTANTS[node.id]
-            else:
-                raise ValueError(f"Unknown constant or variable: {node.id}")
+        return run
+
+    @staticmethod
+    def _compile_call(node):
+        if not isinstance(node.func, ast.Name):
+            raise ValueError(f"Unsupported function call type: {type(node.func).__name__}")
+        func = SafeExpressionEvaluator.MATH_FUNCTIONS.get(node.func.id)
+        if func is None:
+            raise ValueError(f"Unknown or unsafe function: {node.func.id}")
+        args = [SafeExpressionEvaluator._compile_node(arg) for arg in node.args]
+        if len(args) == 1:
+            # Most math functions take one argument; skip building a list
+            arg = args[0]
+            return lambda variables: func(arg(variables))
+        return lambda variables: func(*[arg(variables) for arg in args])
+
+    @staticmethod
+    def _compile_name(node):
+        # Handle named constants, then variables
+        name = node.id
+        if name in SafeExpressionEvaluator.MATH_CONSTANTS:
+            value = SafeExpressionEvaluator.MATH_CONSTANTS[name]
+            return lambda variables: value
+
+        def lookup(variables):
+            try:
+                return variables[name]
+            except KeyError:
+                raise ValueError(f"Unknown constant or variable: {name}") from None
+        return lookup
+
+
+# Node type -> compiler, so _compile_node does one dict lookup instead of an
+# isinstance() chain. Built after the class because staticmethod objects
+# aren't callable inside the class body before Python 3.10.
+SafeExpressionEvaluator._COMPILERS = {
+    ast.Constant: SafeExpressionEvaluator._compile_constant,
+    ast.UnaryOp: SafeExpressionEvaluator._compile_unaryop,
+    ast.BinOp: SafeExpressionEvaluator._compile_binop,
+    ast.Compare: SafeExpressionEvaluator._compile_compare,
+    ast.BoolOp: SafeExpressionEvaluator._compile_boolop,
+    ast.Call: SafeExpressionEvaluator._compile_call,
+    ast.Name: SafeExpressionEvaluator._compile_name,
+}
+
+# Node types _check_expression() accepts. Keyword arguments are allowed but
+# ignored, as they always have been; operator nodes are left to the compilers,
+# which report the unsupported operator by name.
+_EXPRESSION_NODES = frozenset({*SafeExpressionEvaluator._COMPILERS, ast.Load, ast.keyword})
+_OPERATOR_NODES = (ast.operator, ast.unaryop, ast.cmpop, ast.boolop)
+
+
+# Clock (epoch seconds) for TODAY() and NOW(); tests can swap it out
+_time = time.time
+
+# TODAY()'s value and the time (epoch seconds) at which it goes stale
+_today_cache = (0.0, float('-inf'))
+
+
+def _today_days() -> float:
+    """Local midnight today, in days since the epoch; recomputed once a day."""
+    global _today_cache
+    value, expires = _today_cache
+    now = _time()
+    if now >= expires:
+        # Read the clock once, so the expiry check and midnight agree
+        midnight = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+        value = midnight.timestamp() / 86400
+        expires = (midnight + timedelta(days=1)).timestamp()
+        _today_cache = (value, expires)
+    return value
+
+
+def _now_days() -> float:
+    """The current time in days since the epoch (same as datetime.now().timestamp())."""
+    return _time() / 86400
+
+
+def _operand_text(value: Any) -> str:
+    """Format a cell value or function result for splicing into formula text.
+
+    Negative numbers are parenthesized so the value stays one operand, as it
+    is for compiled formulas: with A1 = -4, "A1^2" becomes "(-4.0)**2" = 16
+    rather than "-4.0**2" = -16. Unary minus written in the formula still
+    binds looser than ^, as for number literals ("-A1^2" = -16, "-4^2" = -16).
+    """
+    text = str(value)
+    return f"({text})" if text.startswith('-') else text
+
+
+def _normalize_operators(formula: str) -> str:
+    """Convert spreadsheet operators to Python ones (= to ==, ^ to **)."""
+    # Most formulas contain neither operator, so only scan for the ones present
+    if '=' in formula:
+        # Replace = with == but skip ==, !=, <=, >=
+        # Use negative lookbehind and negative lookahead to avoid double replacement
+        formula = _EQUALS_RE.sub('==', formula)
+    if '^' in formula:
+        formula = formula.replace('^', '**')
+    return formula
+
+
+# Operators that can raise on numbers (ZeroDivisionError, OverflowError)
+_RAISING_OPERATORS = (ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+
+
+class _BooleanCalls(ast.NodeTransformer):
+    """Rewrite AND(...), OR(...) and NOT(...) calls as Python boolean operators.
+
+    AND/OR results are wrapped in "not not" so they are bools, as the text
+    path's "True"/"False" replacements are. Calls whose arguments could raise
+    are left alone, since the text path turns a failing argument into False.
+    """
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        func = node.func
+        if not isinstance(func, ast.Name) or node.keywords or not node.args:
+            return node
+        name = func.id.upper()
+        if name not in ('AND', 'OR', 'NOT') or (name == 'NOT' and len(node.args) != 1):
+            return node
+        for child in ast.walk(ast.Tuple(elts=node.args, ctx=ast.Load())):
+            if isinstance(child, ast.BinOp) and isinstance(child.op, _RAISING_OPERATORS):
+                return node
+
+        if name == 'NOT':
+            result = ast.UnaryOp(op=ast.Not(), operand=node.args[0])
         else:
-            raise ValueError(f"Unsupported expression type: {type(node).__name__}")
+            if len(node.args) == 1:
+                value = node.args[0]
+            else:
+                value = ast.BoolOp(op=ast.And() if name == 'AND' else ast.Or(), values=node.args)
+            result = ast.UnaryOp(op=ast.Not(), operand=ast.UnaryOp(op=ast.Not(), operand=value))
+        return ast.copy_location(result, node)
+
+
+# Node types a compiled formula may contain. The operator entries are the
+# op nodes themselves, which ast.walk() yields alongside the expressions.
+# "not" only comes from _BooleanCalls.
+_ARITHMETIC_NODES = frozenset({
+    ast.Constant, ast.Name, ast.BinOp, ast.UnaryOp, ast.Compare, ast.BoolOp,
+    ast.Load, ast.Not, ast.And, ast.Or,
+    *SafeExpressionEvaluator.OPERATORS,
+    *SafeExpressionEvaluator.COMPARISONS,
+})
+
+
+def _is_arithmetic(node: ast.AST) -> bool:
+    """Check that an expression only combines numbers and cell references.
+
+    These are the formulas whose result depends on nothing but the referenced
+    cells' values, so they can be compiled once and re-run for any sheet.
+    """
+    for child in ast.walk(node):
+        node_type = type(child)
+        if node_type not in _ARITHMETIC_NODES:
+            return False
+        if node_type is ast.Constant:
+            if type(child.value) not in (int, float, bool):
+                return False
+        elif node_type is ast.Name:
+            if not _CELL_ARG_RE.match(child.id):
+                return False
+        elif node_type is ast.Compare:
+            if len(child.ops) != 1:
+                return False
+    return True
+
+
+@lru_cache(maxsize=4096)
+def _compile_formula(formula: str):
+    """Compile a purely arithmetic formula, e.g. "=(A1+B1)*2" or "=AND(A1>1, B1<5)".
+
+    Returns (run, cell_refs), or None when the formula needs FormulaEngine's
+    function handling. run() takes a dict of cell values keyed by the names in
+    cell_refs. The expression has been checked by _is_arithmetic(), so it can
+    only do arithmetic, comparisons and AND/OR/NOT on those values.
+    """
+    try:
+        node = ast.parse(_normalize_operators(formula[1:].strip()), mode='eval')
+    except SyntaxError:
+        return None
+    # Python's own and/or/not stay on the text path, which rejects "not" and
+    # reads "and(" / "or(" as the spreadsheet functions; only the ones
+    # rewritten from AND()/OR()/NOT() are allowed
+    for child in ast.walk(node):
+        if isinstance(child, (ast.BoolOp, ast.Not)):
+            return None
+    node = ast.fix_missing_locations(_BooleanCalls().visit(node))
+    body = node.body
+    if not _is_arithmetic(body):
+        return None
+
+    # A lone cell reference or number needs no eval() at all
+    if isinstance(body, ast.Name):
+        return operator.itemgetter(body.id), (body.id,)
+    if isinstance(body, ast.Constant):
+        return (lambda names, value=body.value: value), ()
+
+    cell_refs = tuple(sorted({child.id for child in ast.walk(node) if isinstance(child, ast.Name)}))
+    return partial(eval, compile(node, '<formula>', 'eval'), {'__builtins__': {}}), cell_refs
+
+
+@lru_cache(maxsize=256)
+def _col_letter(index: int) -> str:
+    """Convert a zero-based column index to letters (0->A, 25->Z, 26->AA)."""
+    name = ""
+    while index >= 0:
+        name = chr(65 + (index % 26)) + name
+        index = index // 26 - 1
+    return name
+
+
+@lru_cache(maxsize=256)
+def _col_index(letters: str) -> int:
+    """Convert column letters to a zero-based index (A->0, Z->25, AA->26)."""
+    index = 0
+    # Iterating bytes yields the character codes directly, no ord() per letter
+    for code in letters.encode('ascii'):
+        index = index * 26 + (code - 64)
+    return index - 1
+
+
+@lru_cache(maxsize=4096)
+def _cell_position(cell_ref: str) -> Optional[tuple]:
+    """Get (row, col) of a cell reference such as "B3", with 1-based row, or None."""
+    # Split off the row digits with str methods rather than a regex match;
+    # this runs for every saved cell when a sheet loads
+    col_str = cell_ref.rstrip('0123456789')
+    row_str = cell_ref[len(col_str):]
+    if row_str and col_str.isascii() and col_str.isalpha() and col_str.isupper():
+        return int(row_str), _col_index(col_str)
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _range_bounds(range_str: str) -> Optional[tuple]:
+    """Get (first row, last row, first col, last col) of a range such as "A1:B2", or None."""
+    match = _RANGE_RE.match(range_str)
+    if not match:
+        return None
+    start_col, start_row, end_col, end_row = match.groups()
+    return int(start_row), int(end_row), _col_index(start_col), _col_index(end_col)
+
+
+def _range_covers(range_str: str, cell_ref: str) -> bool:
+    """Check whether a range may include cell_ref (True if either can't be parsed)."""
+    bounds = _range_bounds(range_str)
+    position = _cell_position(cell_ref)
+    if bounds is None or position is None:
+        return True
+    row, col = position
+    return bounds[0] <= row <= bounds[1] and bounds[2] <= col <= bounds[3]
+
+
+@lru_cache(maxsize=4096)
+def _range_refs(range_str: str) -> tuple:
+    """Expand a range such as "A1:B2" into its cell references, row by row.
+
+    The references are interned, like the keys recalculate() builds and the
+    names in compiled formulas, so cell lookups match on identity.
+    """
+    bounds = _range_bounds(range_str)
+    if bounds is None:
+        return ()
+
+    first_row, last_row, first_col, last_col = bounds
+    col_names = [_col_letter(idx) for idx in range(first_col, last_col + 1)]
+    return tuple(
+        sys.intern(f"{col_name}{row}")
+        for row in range(first_row, last_row + 1)
+        for col_name in col_names
+    )
+
+
+@lru_cache(maxsize=4096)
+def _formula_refs(formula: str) -> frozenset:
+    """Cell references a formula may read, including every cell of its ranges.
+
+    Only used to order recalculation, so a reference that turns out to be
+    text (e.g. inside a string) is harmless.
+    """
+    refs = {match.group(0) for match in _CELL_REF_RE.finditer(formula)}
+    for match in _RANGE_RE.finditer(formula):
+        refs.update(_range_refs(match.group(0)))
+    return frozenset(refs)
+
+
+class _FormulaCycleError(ValueError):
+    """Raised when a formula refers back to a cell that is still being evaluated."""
 
 
 class FormulaEngine:
     """Simple formula engine for spreadsheet calculations."""
 
-    def __init__(self, cells: Dict[str, Any]):
-        self.cells = cells
+    def __init__(self, cells: Mapping[str, Any]):
+        self.cells = cells  # Only written through set_cell()/update()
+        # Evaluated results of formula cells, keyed by cell reference, kept
+        # until a cell they depend on changes
+        self._cache: Dict[str, Any] = {}
+        # Cell reference -> formula cells whose cached result read it
+        self._dependents: Dict[str, set] = {}
+        # Formula cells being evaluated, innermost last (used as an ordered set)
+        self._in_progress: Dict[str, None] = {}
+        # Expanded range values, keyed by range text (e.g. "A1:B2")
+        self._range_cache: Dict[str, list] = {}
+        # Cell values already converted by _cell_number() (None if not numeric)
+        self._numbers: Dict[str, Optional[float]] = {}
+
+    def set_cell(self, cell_ref: str, value: Any):
+        """Change (or with None, clear) one cell and drop results that depended on it."""
+        if value is None:
+            self.cells.pop(cell_ref, None)
+        else:
+            self.cells[cell_ref] = value
+        self._invalidate(cell_ref)
+
+    def update(self, cells: Mapping[str, Any]):
+        """Bring the engine's cells in line with cells, invalidating only what changed."""
+        current = self.cells
+        for cell_ref in [ref for ref in current if ref not in cells]:
+            self.set_cell(cell_ref, None)
+        for cell_ref, value in cells.items():
+            if current.get(cell_ref) != value:
+                self.set_cell(cell_ref, value)
+            elif _VOLATILE_RE.search(str(value)):
+                # TODAY()/NOW() results go stale without any cell changing
+                self._invalidate(cell_ref)
+
+    def recalc_all(self) -> Dict[str, Any]:
+        """Evaluate every formula cell and return the results by cell reference.
+
+        Cells are evaluated in dependency order (Kahn's algorithm), so each
+        formula finds the formula cells it reads already cached instead of
+        recursing into them; long reference chains stay shallow. Cells on or
+        behind a cycle come last and report #CYCLE!.
+        """
+        formulas = {
+            ref: value for ref, value in self.cells.items()
+            if isinstance(value, str) and value.startswith('=')
+        }
+
+        # Formula cell -> number of formula cells it still waits for
+        waiting: Dict[str, int] = {}
+        readers: Dict[str, list] = {}
+        for ref, formula in formulas.items():
+            inputs = [dep for dep in _formula_refs(formula) if dep in formulas]
+            waiting[ref] = len(inputs)
+            for dep in inputs:
+                readers.setdefault(dep, []).append(ref)
+
+        ready = deque(ref for ref, count in waiting.items() if count == 0)
+        order = []
+        while ready:
+            ref = ready.popleft()
+            order.append(ref)
+            for reader in readers.get(ref, ()):
+                waiting[reader] -= 1
+                if not waiting[reader]:
+                    ready.append(reader)
+        if len(order) < len(formulas):
+            ordered = set(order)
+            order.extend(ref for ref in formulas if ref not in ordered)
+
+        results = {}
+        for ref in order:
+            try:
+                results[ref] = self._cell_value(ref)
+            except _FormulaCycleError:
+                results[ref] = "#CYCLE!"
+        return results
+
+    def _invalidate(self, cell_ref: str):
+        """Drop the cached result of cell_ref and of every formula that depends on it."""
+        pending = [cell_ref]
+        range_cache = self._range_cache
+        while pending:
+            ref = pending.pop()
+            self._cache.pop(ref, None)
+            self._numbers.pop(ref, None)
+            pending.extend(self._dependents.pop(ref, ()))
+            # Cached ranges covering ref go too, along with the formulas that
+            # read them; ranges elsewhere on the sheet stay cached
+            if range_cache:
+                for range_str in [r for r in range_cache if _range_covers(r, ref)]:
+                    del range_cache[range_str]
+                    pending.extend(self._dependents.pop(range_str, ()))
 
     def evaluate(self, formula: str) -> Any:
         """Evaluate a formula."""
-        if not formula.startswith('='):
+        # Literal values (most cells) pass straight through
+        if not (isinstance(formula, str) and formula.startswith('=')):
             return formula
 
+        compiled = _compile_formula(formula)
+        if compiled is not None:
+            return self._run_compiled(*compiled)
+
         formula = formula[1:].strip()
 
         # Normalize single = to == for equality comparisons
         # (but not in cell ranges or function calls)
         formula = self.normalize_equality_operator(formula)
 
-        # Handle functions first (preserves cell references in function arguments)
-        formula = self.handle_functions(formula)
+        try:
+            # Handle functions first (preserves cell references in function arguments)
+            formula = self.handle_functions(formula)
 
-        # Replace cell references with values after function handling
-        formula = self.replace_cell_references(formula)
+            # Replace cell references with values after function handling
+            formula = self.replace_cell_references(formula)
+        except _FormulaCycleError:
+            # Unwind to the outermost formula so the whole chain reports the cycle
+            if self._in_progress:
+                raise
+            return "#CYCLE!"
 
         try:
             result = SafeExpressionEvaluator.evaluate(formula)
@@ -181,6 +696,21 @@ class FormulaEngine:
         except Exception as e:
             return f"#ERROR: {str(e)}"
 
+    def _run_compiled(self, run, cell_refs) -> Any:
+        """Run a formula compiled by _compile_formula() against this engine's cells."""
+        try:
+            names = {cell_ref: self._cell_operand(cell_ref) for cell_ref in cell_refs}
+        except _FormulaCycleError:
+            if self._in_progress:
+                raise
+            return "#CYCLE!"
+
+        try:
+            return _real(run(names))
+        except Exception as e:
+            # Same message SafeExpressionEvaluator produces for the text path
+            return f"#ERROR: Invalid expression: {str(e)}"
+
     def normalize_equality_operator(self, formula: str) -> str:
         """
         Convert single = to == for equality comparisons.
@@ -188,220 +718,242 @@ class FormulaEngine:
 
         Strategy: Replace = with == only when it's not already ==, !=, <=, or >=
         """
-        # Replace = with == but skip ==, !=, <=, >=
-        # Use negative lookbehind and negative lookahead to avoid double replacement
-        normalized = re.sub(
-            r'(?<![=!<>])=(?!=)',  # Match = not preceded by =!<> and not followed by =
-            '==',
-            formula
-        )
+        # Also converts ^ to ** for exponentiation (Excel-style)
+        return _normalize_operators(formula)
+
+    def _cell_value(self, cell_ref: str) -> Any:
+        """Get a cell's value, evaluating formula cells at most once."""
+        in_progress = self._in_progress
+        if in_progress:
+            # Remember that the formula being evaluated read this cell
+            self._dependents.setdefault(cell_ref, set()).add(next(reversed(in_progress)))
+
+        value = self.cells.get(cell_ref, 0)
+        if not (isinstance(value, str) and value.startswith('=')):
+            return value
+
+        cache = self._cache
+        if cell_ref in cache:
+            return cache[cell_ref]
+        if cell_ref in in_progress:
+            raise _FormulaCycleError(cell_ref)
+
+        in_progress[cell_ref] = None
+        try:
+            result = self.evaluate(value)
+        finally:
+            del in_progress[cell_ref]
+        cache[cell_ref] = result
+        return result
 
-        # Also convert ^ to ** for exponentiation (Excel-style)
-        normalized = normalized.replace('^', '**')
+    def _cell_number(self, cell_ref: str) -> Optional[float]:
+        """Get a cell's value as a float, or None if it isn't numeric.
 
-        return normalized
+        The conversion is kept until the cell is invalidated, so unchanged
+        cells aren't parsed again on every read.
+        """
+        numbers = self._numbers
+        if cell_ref in numbers:
+            in_progress = self._in_progress
+            if in_progress:
+                self._dependents.setdefault(cell_ref, set()).add(next(reversed(in_progress)))
+            return numbers[cell_ref]
+
+        value = self._cell_value(cell_ref)
+        try:
+            number = float(value)
+        except (ValueError, TypeError):
+            number = None
+        numbers[cell_ref] = number
+        return number
+
+    def _cell_operand(self, cell_ref: str) -> Any:
+        """Get the number a cell contributes to an expression."""
+        # Try to convert to float first
+        number = self._cell_number(cell_ref)
+        if number is not None:
+            return number
+
+        # Check if it's a date string (YYYY-MM-DD format)
+        value = self._cell_value(cell_ref)
+        if isinstance(value, str):
+            try:
+                # Try parsing as date
+                date_obj = datetime.strptime(value, "%Y-%m-%d")
+                # Convert to timestamp (days since epoch)
+                return date_obj.timestamp() / 86400
+            except ValueError:
+                pass
+        return 0
 
     def replace_cell_references(self, formula: str) -> str:
         """Replace cell references (A1, B2, etc.) with their values."""
-        pattern = r'\b([A-Z]+)(\d+)\b'
-
-        def replace(match):
-            cell_ref = match.group(0)
-            value = self.cells.get(cell_ref, 0)
-            if isinstance(value, str) and value.startswith('='):
-                value = self.evaluate(value)
-
-            # Try to convert to float first
-            try:
-                return str(float(value))
-            except (ValueError, TypeError):
-                # Check if it's a date string (YYYY-MM-DD format)
-                if isinstance(value, str):
-                    try:
-                        # Try parsing as date
-                        date_obj = datetime.strptime(value, "%Y-%m-%d")
-                        # Convert to timestamp (days since epoch)
-                        timestamp = date_obj.timestamp() / 86400
-                        return str(timestamp)
-                    except ValueError:
-                        pass
-                return '0'
-
-        return re.sub(pattern, replace, formula)
+        return _CELL_REF_RE.sub(lambda m: _operand_text(self._cell_operand(m.group(0))), formula)
 
     def handle_functions(self, formula: str) -> str:
         """Handle spreadsheet functions."""
         # Process in multiple passes to handle nested functions properly
 
+        # Each pass below can only match if its name appears in the formula, so
+        # one upper-cased copy lets us skip the regex scans that can't match.
+        # Passes only ever re-emit names that were already there.
+        names = formula.upper()
+
         # First pass: Replace constants and zero-argument functions
         # PI constant
-        formula = re.sub(r'\bPI\(\)', str(math.pi), formula, flags=re.IGNORECASE)
-        formula = re.sub(r'\bPI\b', str(math.pi), formula, flags=re.IGNORECASE)
+        if 'PI' in names:
+            formula = _PI_CALL_RE.sub(str(math.pi), formula)
+            formula = _PI_RE.sub(str(math.pi), formula)
 
         # E constant
-        formula = re.sub(r'\bE\(\)', str(math.e), formula, flags=re.IGNORECASE)
-        formula = re.sub(r'\bE\b', str(math.e), formula, flags=re.IGNORECASE)
+        if 'E' in names:
+            formula = _E_CALL_RE.sub(str(math.e), formula)
+            formula = _E_RE.sub(str(math.e), formula)
 
         # TODAY function - returns numeric timestamp (days since epoch)
-        today_timestamp = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp() / 86400
-        formula = re.sub(r'TODAY\(\)', str(today_timestamp), formula, flags=re.IGNORECASE)
+        if 'TODAY(' in names:
+            formula = _TODAY_RE.sub(str(_today_days()), formula)
 
         # NOW function - returns numeric timestamp (days since epoch with fractional part for time)
-        now_timestamp = datetime.now().timestamp() / 86400
-        formula = re.sub(r'NOW\(\)', str(now_timestamp), formula, flags=re.IGNORECASE)
+        if 'NOW(' in names:
+            formula = _NOW_RE.sub(str(_now_days()), formula)
 
         # Second pass: Process other functions that may use TODAY/NOW results
         # SUM function
-        formula = re.sub(
-            r'SUM\((.*?)\)',
-            lambda m: str(self.func_sum(m.group(1))),
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'SUM(' in names:
+            formula = _SUM_RE.sub(
+                lambda m: _operand_text(self.func_sum(m.group(1))),
+                formula
+            )
 
         # AVERAGE function
-        formula = re.sub(
-            r'AVERAGE\((.*?)\)',
-            lambda m: str(self.func_average(m.group(1))),
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'AVERAGE(' in names:
+            formula = _AVERAGE_RE.sub(
+                lambda m: _operand_text(self.func_average(m.group(1))),
+                formula
+            )
 
         # IF function
-        formula = re.sub(
-            r'IF\((.*?),(.*?),(.*?)\)',
-            lambda m: self.func_if(m.group(1), m.group(2), m.group(3)),
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'IF(' in names:
+            formula = _IF_RE.sub(
+                lambda m: self.func_if(m.group(1), m.group(2), m.group(3)),
+                formula
+            )
 
         # DATE function - converts a numeric timestamp back to date string
         # Process this last so it can work with results from other functions
-        formula = re.sub(
-            r'DATE\((.*?)\)',
-            lambda m: self.func_date(m.group(1)),
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'DATE(' in names:
+            formula = _DATE_RE.sub(
+                lambda m: self.func_date(m.group(1)),
+                formula
+            )
 
         # TIME function - converts a numeric timestamp to time string (HH:MM:SS)
-        formula = re.sub(
-            r'TIME\((.*?)\)',
-            lambda m: self.func_time(m.group(1)),
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'TIME(' in names:
+            formula = _TIME_RE.sub(
+                lambda m: self.func_time(m.group(1)),
+                formula
+            )
 
         # MIN function
-        formula = re.sub(
-            r'MIN\((.*?)\)',
-            lambda m: str(self.func_min(m.group(1))),
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'MIN(' in names:
+            formula = _MIN_RE.sub(
+                lambda m: _operand_text(self.func_min(m.group(1))),
+                formula
+            )
 
         # MAX function
-        formula = re.sub(
-            r'MAX\((.*?)\)',
-            lambda m: str(self.func_max(m.group(1))),
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'MAX(' in names:
+            formula = _MAX_RE.sub(
+                lambda m: _operand_text(self.func_max(m.group(1))),
+                formula
+            )
 
         # COUNT function
-        formula = re.sub(
-            r'COUNT\((.*?)\)',
-            lambda m: str(self.func_count(m.group(1))),
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'COUNT(' in names:
+            formula = _COUNT_RE.sub(
+                lambda m: _operand_text(self.func_count(m.group(1))),
+                formula
+            )
 
         # MEDIAN function
-        formula = re.sub(
-            r'MEDIAN\((.*?)\)',
-            lambda m: str(self.func_median(m.group(1))),
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'MEDIAN(' in names:
+            formula = _MEDIAN_RE.sub(
+                lambda m: _operand_text(self.func_median(m.group(1))),
+                formula
+            )
 
         # MOD function (modulo operation)
-        formula = re.sub(
-            r'MOD\((.*?),(.*?)\)',
-            lambda m: f'({m.group(1)} % {m.group(2)})',
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'MOD(' in names:
+            formula = _MOD_RE.sub(
+                lambda m: f'({m.group(1)} % {m.group(2)})',
+                formula
+            )
 
         # FLOOR function (spreadsheet-style, converts to lowercase for Python)
-        formula = re.sub(
-            r'FLOOR\((.*?)\)',
-            lambda m: f'floor({m.group(1)})',
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'FLOOR(' in names:
+            formula = _FLOOR_RE.sub(
+                lambda m: f'floor({m.group(1)})',
+                formula
+            )
 
         # CEILING/CEIL function (spreadsheet-style, converts to lowercase for Python)
-        formula = re.sub(
-            r'CEILING\((.*?)\)',
-            lambda m: f'ceil({m.group(1)})',
-            formula,
-            flags=re.IGNORECASE
-        )
-        formula = re.sub(
-            r'CEIL\((.*?)\)',
-            lambda m: f'ceil({m.group(1)})',
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'CEILING(' in names:
+            formula = _CEILING_RE.sub(
+                lambda m: f'ceil({m.group(1)})',
+                formula
+            )
+        if 'CEIL(' in names:
+            formula = _CEIL_RE.sub(
+                lambda m: f'ceil({m.group(1)})',
+                formula
+            )
 
         # ABS function (spreadsheet-style, converts to lowercase for Python)
-        formula = re.sub(
-            r'ABS\((.*?)\)',
-            lambda m: f'abs({m.group(1)})',
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'ABS(' in names:
+            formula = _ABS_RE.sub(
+                lambda m: f'abs({m.group(1)})',
+                formula
+            )
 
         # ROUND function (spreadsheet-style, converts to lowercase for Python)
-        formula = re.sub(
-            r'ROUND\((.*?)\)',
-            lambda m: f'round({m.group(1)})',
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'ROUND(' in names:
+            formula = _ROUND_RE.sub(
+                lambda m: f'round({m.group(1)})',
+                formula
+            )
 
         # SQRT function (spreadsheet-style, converts to lowercase for Python)
-        formula = re.sub(
-            r'SQRT\((.*?)\)',
-            lambda m: f'sqrt({m.group(1)})',
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'SQRT(' in names:
+            formula = _SQRT_RE.sub(
+                lambda m: f'sqrt({m.group(1)})',
+                formula
+            )
 
         # POWER/POW function (spreadsheet-style, converts to lowercase for Python)
-        formula = re.sub(
-            r'POWER\((.*?)\)',
-            lambda m: f'pow({m.group(1)})',
-            formula,
-            flags=re.IGNORECASE
-        )
-        formula = re.sub(
-            r'POW\((.*?)\)',
-            lambda m: f'pow({m.group(1)})',
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'POWER(' in names:
+            formula = _POWER_RE.sub(
+                lambda m: f'pow({m.group(1)})',
+                formula
+            )
+        if 'POW(' in names:
+            formula = _POW_RE.sub(
+                lambda m: f'pow({m.group(1)})',
+                formula
+            )
 
         # Boolean functions - AND, OR, NOT
         # These need special handling because they can have variable numbers of arguments
+        # Most formulas use none of them, so check once before defining the helpers
+        if 'NOT(' not in names and 'AND(' not in names and 'OR(' not in names:
+            return formula
 
         # NOT function (single argument)
-        formula = re.sub(
-            r'\bNOT\((.*?)\)',
-            lambda m: self.func_not(m.group(1)),
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'NOT(' in names:
+            formula = _NOT_RE.sub(
+                lambda m: self.func_not(m.group(1)),
+                formula
+            )
 
         # AND function (variable arguments) - use a custom parser
         def process_and(match):
@@ -410,12 +962,11 @@ class FormulaEngine:
             conditions = self._split_function_args(args)
             return self.func_and(*conditions)
 
-        formula = re.sub(
-            r'\bAND\((.*?)\)',
-            process_and,
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'AND(' in names:
+            formula = _AND_RE.sub(
+                process_and,
+                formula
+            )
 
         # OR function (variable arguments) - use a custom parser
         def process_or(match):
@@ -424,12 +975,11 @@ class FormulaEngine:
             conditions = self._split_function_args(args)
             return self.func_or(*conditions)
 
-        formula = re.sub(
-            r'\bOR\((.*?)\)',
-            process_or,
-            formula,
-            flags=re.IGNORECASE
-        )
+        if 'OR(' in names:
+            formula = _OR_RE.sub(
+                process_or,
+                formula
+            )
 
         return formula
 
@@ -497,23 +1047,22 @@ class FormulaEngine:
 
     def _parse_function_args(self, args: str) -> list:
         """Parse function arguments including cell references and ranges."""
-        values = []
         parts = [p.strip() for p in args.split(',')]
+        # A lone range (e.g. SUM(A1:A100)) is the common case: hand back the
+        # engine's cached values instead of copying them. Callers only read it.
+        if len(parts) == 1 and ':' in parts[0]:
+            return self._expand_range(parts[0])
+
+        values = []
 
         for part in parts:
             # Check if it's a range (e.g., B3:B4)
             if ':' in part:
                 values.extend(self._expand_range(part))
             # Check if it's a cell reference (e.g., B3)
-            elif re.match(r'^[A-Z]+\d+$', part):
-                cell_value = self.cells.get(part, 0)
-                # If cell contains a formula, evaluate it
-                if isinstance(cell_value, str) and cell_value.startswith('='):
-                    cell_value = self.evaluate(cell_value)
-                try:
-                    values.append(float(cell_value))
-                except (ValueError, TypeError):
-                    values.append(0)
+            elif _CELL_ARG_RE.match(part):
+                number = self._cell_number(part)
+                values.append(0 if number is None else number)
             # Otherwise, it's a literal number
             else:
                 try:
@@ -525,50 +1074,18 @@ class FormulaEngine:
 
     def _expand_range(self, range_str: str) -> list:
         """Expand a cell range (e.g., B3:B4) into individual values."""
-        match = re.match(r'([A-Z]+)(\d+):([A-Z]+)(\d+)', range_str)
-        if not match:
-            return []
-
-        start_col, start_row, end_col, end_row = match.groups()
-        start_row, end_row = int(start_row), int(end_row)
+        if self._in_progress:
+            self._dependents.setdefault(range_str, set()).add(next(reversed(self._in_progress)))
+        cached = self._range_cache.get(range_str)
+        if cached is not None:
+            return cached
 
         values = []
-        # Handle single column range (most common, e.g., B3:B4)
-        if start_col == end_col:
-            for row in range(start_row, end_row + 1):
-                cell_ref = f"{start_col}{row}"
-                cell_value = self.cells.get(cell_ref, 0)
-                # If cell contains a formula, evaluate it
-                if isinstance(cell_value, str) and cell_value.startswith('='):
-                    cell_value = self.evaluate(cell_value)
-                try:
-                    values.append(float(cell_value))
-                except (ValueError, TypeError):
-                    values.append(0)
-        else:
-            # Handle multi-column ranges (e.g., A1:B2)
-            start_col_idx = sum((ord(c) - 65) * (26 ** i) for i, c in enumerate(reversed(start_col)))
-            end_col_idx = sum((ord(c) - 65) * (26 ** i) for i, c in enumerate(reversed(end_col)))
-
-            for row in range(start_row, end_row + 1):
-                for col_idx in range(start_col_idx, end_col_idx + 1):
-                    # Convert column index back to letter
-                    col_name = ""
-                    temp_idx = col_idx
-                    while temp_idx >= 0:
-                        col_name = chr(65 + (temp_idx % 26)) + col_name
-                        temp_idx = temp_idx // 26 - 1
-
-                    cell_ref = f"{col_name}{row}"
-                    cell_value = self.cells.get(cell_ref, 0)
-                    # If cell contains a formula, evaluate it
-                    if isinstance(cell_value, str) and cell_value.startswith('='):
-                        cell_value = self.evaluate(cell_value)
-                    try:
-                        values.append(float(cell_value))
-                    except (ValueError, TypeError):
-                        values.append(0)
+        for cell_ref in _range_refs(range_str):
+            number = self._cell_number(cell_ref)
+            values.append(0 if number is None else number)
 
+        self._range_cache[range_str] = values
         return values
 
     def func_if(self, condition: str, true_val: str, false_val: str) -> str:
@@ -631,7 +1148,8 @@ class FormulaEngine:
             # Convert from days to seconds and create datetime
             date_obj = datetime.fromtimestamp(float(timestamp) * 86400)
             # Return formatted date string in quotes (so it's treated as a string in the formula)
-            return f'"{date_obj.strftime("%Y-%m-%d")}"'
+            # isoformat() gives the same YYYY-MM-DD without strftime's format parsing
+            return f'"{date_obj.date().isoformat()}"'
         except Exception as e:
             return f'"#ERROR: {str(e)}"'
 
@@ -648,7 +1166,7 @@ class FormulaEngine:
             # Convert from days to seconds and create datetime
             time_obj = datetime.fromtimestamp(float(timestamp) * 86400)
             # Return formatted time string in quotes (24-hour format: HH:MM:SS)
-            return f'"{time_obj.strftime("%H:%M:%S")}"'
+            return f'"{time_obj.time().isoformat(timespec="seconds")}"'
         except Exception as e:
             return f'"#ERROR: {str(e)}"'
 
@@ -682,11 +1200,59 @@ class SpreadsheetTableWidget(QTableWidget):
         super().keyPressEvent(event)
 
 
+class SheetSaveSignals(QObject):
+    """Results a SheetSaveTask reports back to the UI thread."""
+
+    saved = pyqtSignal(int, int)        # sheet_id, revision
+    failed = pyqtSignal(int, int)       # sheet_id, revision
+
+
+class SheetSaveTask(QRunnable):
+    """Encode a sheet snapshot and write it to the database off the UI thread.
+
+    The task touches no widget state; the outcome is emitted through
+    signals, which Qt queues onto the UI thread. written maps sheet id to
+    the payload last written; the save pool's single thread is the only one
+    using it while saves are pending.
+    """
+
+    def __init__(self, database, signals: SheetSaveSignals, sheet_id: int, name: str,
+                 sheet_data: Dict[str, Any], revision: int, written: Dict[int, str]):
+        super().__init__()
+        self.database = database
+        self.signals = signals
+        self.sheet_id = sheet_id
+        self.name = name
+        self.sheet_data = sheet_data
+        self.revision = revision
+        self.written = written
+
+    def run(self):
+        """Serialize the snapshot and flush it to the database."""
+        try:
+            data = json.dumps(self.sheet_data)
+            # Skip the write if edits since the last save cancelled out
+            # (e.g. bold toggled on and off)
+            if self.written.get(self.sheet_id) != data:
+                self.database.update_spreadsheet(self.sheet_id, self.name, data)
+                self.written[self.sheet_id] = data
+        except Exception as e:
+            logger.error(f"Failed to save spreadsheet id={self.sheet_id}: {e}", exc_info=True)
+            # What is stored is no longer known, so never skip the retry
+            self.written.pop(self.sheet_id, None)
+            self.signals.failed.emit(self.sheet_id, self.revision)
+            return
+        self.signals.saved.emit(self.sheet_id, self.revision)
+
+
 class SpreadsheetWidget(QWidget):
     """Widget for managing spreadsheets."""
 
     sheet_modified = pyqtSignal()
 
+    # Maximum number of sheet snapshots kept for undo/redo
+    MAX_UNDO_STEPS = 200
+
     def __init__(self, database, config, parent=None):
         super().__init__(parent)
         self.database = database
@@ -694,8 +1260,26 @@ class SpreadsheetWidget(QWidget):
         self.current_sheet_id = None
         self.current_sheet_name = None  # Track current sheet name separately
         self.is_modified = False
-        self.undo_stack = []
-        self.redo_stack = []
+        self._revision = 0  # Bumped on every edit; tells a finished save if it is stale
+        self._queued_save = None  # (sheet_id, revision) of the newest queued save
+        self._written: Dict[int, str] = {}  # Payload last written per sheet, see SheetSaveTask
+        # (row, col) of every cell that holds an item, so saving and recalculation
+        # visit only those instead of scanning the whole grid
+        self._occupied = set()
+        # Non-default section sizes, kept current by the header resize slots
+        self._custom_col_widths: Dict[int, int] = {}
+        self._custom_row_heights: Dict[int, int] = {}
+        # Single worker so saves reach the database in the order they were made
+        self._save_pool = QThreadPool(self)
+        self._save_pool.setMaxThreadCount(1)
+        self._save_signals = SheetSaveSignals(self)
+        self._save_signals.saved.connect(self._on_sheet_saved)
+        self._save_signals.failed.connect(self._on_sheet_save_failed)
+        # Bounded history: the oldest snapshot is dropped once the limit is hit
+        self.undo_stack = deque(maxlen=self.MAX_UNDO_STEPS)
+        self.redo_stack = deque(maxlen=self.MAX_UNDO_STEPS)
+        # Kept across recalculations so unchanged formula results stay cached
+        self._engine: Optional[FormulaEngine] = None
         self.autosave_timer = QTimer()
         self.autosave_timer.timeout.connect(self.autosave)
 
@@ -788,9 +1372,9 @@ class SpreadsheetWidget(QWidget):
         self.table.currentCellChanged.connect(self.on_cell_selected)
         self.table.itemChanged.connect(self.on_cell_changed)
 
-        # Connect header resize events to mark sheet as modified
-        self.table.horizontalHeader().sectionResized.connect(self.on_header_resized)
-        self.table.verticalHeader().sectionResized.connect(self.on_header_resized)
+        # Connect header resize events to track custom sizes and mark sheet as modified
+        self.table.horizontalHeader().sectionResized.connect(self.on_column_resized)
+        self.table.verticalHeader().sectionResized.connect(self.on_row_resized)
 
         right_layout.addWidget(self.table)
 
@@ -849,19 +1433,20 @@ class SpreadsheetWidget(QWidget):
 
     def col_name(self, index: int) -> str:
         """Convert column index to letter (0->A, 1->B, etc.)."""
-        name = ""
-        while index >= 0:
-            name = chr(65 + (index % 26)) + name
-            index = index // 26 - 1
-        return name
+        return _col_letter(index)
 
     def cell_ref(self, row: int, col: int) -> str:
         """Get cell reference (e.g., A1)."""
-        return f"{self.col_name(col)}{row + 1}"
+        # Interned so the engine's cell dicts compare keys by identity
+        return sys.intern(f"{self.col_name(col)}{row + 1}")
 
     def load_sheets(self):
         """Load spreadsheets into the list."""
+        self.wait_for_pending_saves()
         self.sheet_list.clear()
+        # The database may have changed underneath us (e.g. a sync reload).
+        # The save pool is idle after the wait, so this thread may clear it
+        self._written.clear()
         sheets = self.database.get_all_spreadsheets()
         for sheet in sheets:
             self.sheet_list.addItem(sheet['name'])
@@ -873,6 +1458,13 @@ class SpreadsheetWidget(QWidget):
         """Handle sheet selection."""
         if self.is_modified:
             self.save_current_sheet()
+        # The selected sheet may be the one still being written
+        self.wait_for_pending_saves()
+        if self.is_modified and self.current_sheet_id:
+            # The save failed; keep the sheet open rather than drop its edits
+            QMessageBox.warning(self, "Save Failed",
+                                f"Could not save '{self.current_sheet_name}'. Your changes are still open.")
+            return
 
         sheet_id = item.data(Qt.ItemDataRole.UserRole)
         sheet = self.database.get_spreadsheet(sheet_id)
@@ -887,6 +1479,7 @@ class SpreadsheetWidget(QWidget):
         """Load sheet data into the table."""
         self.table.blockSignals(True)
         self.table.clearContents()
+        self._occupied.clear()
 
         try:
             sheet_data = json.loads(data) if data else {}
@@ -894,28 +1487,43 @@ class SpreadsheetWidget(QWidget):
             # Load cell data (backward compatible with old format)
             cells = sheet_data if isinstance(sheet_data, dict) and 'cells' not in sheet_data else sheet_data.get('cells', {})
 
+            row_count = self.table.rowCount()
+            col_count = self.table.columnCount()
+            item_at = self.table.item
+            set_item = self.table.setItem
+            user_role = Qt.ItemDataRole.UserRole
+
             for cell_ref, value in cells.items():
                 row, col = self.parse_cell_ref(cell_ref)
-                if row < self.table.rowCount() and col < self.table.columnCount():
-                    item = QTableWidgetItem(str(value))
+                if row < row_count and col < col_count:
+                    value = str(value)
+                    item = QTableWidgetItem(value)
                     # If value is a formula, store it in UserRole
-                    if str(value).startswith('='):
-                        item.setData(Qt.ItemDataRole.UserRole, str(value))
-                    self.table.setItem(row, col, item)
+                    if value.startswith('='):
+                        item.setData(user_role, value)
+                    set_item(row, col, item)
+                    self._occupied.add((row, col))
 
             # Load cell formatting if available
             if isinstance(sheet_data, dict) and 'cell_formatting' in sheet_data:
                 for cell_ref, formatting in sheet_data['cell_formatting'].items():
                     row, col = self.parse_cell_ref(cell_ref)
-                    if row < self.table.rowCount() and col < self.table.columnCount():
-                        item = self.table.item(row, col)
+                    if row < row_count and col < col_count:
+                        item = item_at(row, col)
                         if item:
+                            # Older sheets store formatting as a dict of flags
+                            if isinstance(formatting, dict):
+                                formatting = (
+                                    (FORMAT_BOLD if formatting.get('bold') else 0)
+                                    | (FORMAT_ITALIC if formatting.get('italic') else 0)
+                                    | (FORMAT_UNDERLINE if formatting.get('underline') else 0)
+                                )
                             font = item.font()
-                            if formatting.get('bold'):
+                            if formatting & FORMAT_BOLD:
                                 font.setBold(True)
-                            if formatting.get('italic'):
+                            if formatting & FORMAT_ITALIC:
                                 font.setItalic(True)
-                            if formatting.get('underline'):
+                            if formatting & FORMAT_UNDERLINE:
                                 font.setUnderline(True)
                             item.setFont(font)
 
@@ -937,69 +1545,53 @@ class SpreadsheetWidget(QWidget):
 
     def parse_cell_ref(self, cell_ref: str):
         """Parse cell reference (e.g., A1) to row, col."""
-        match = re.match(r'([A-Z]+)(\d+)', cell_ref)
-        if match:
-            col_str, row_str = match.groups()
-            col = sum((ord(c) - 65) * (26 ** i) for i, c in enumerate(reversed(col_str)))
-            row = int(row_str) - 1
-            return row, col
-        return 0, 0
+        position = _cell_position(cell_ref)
+        if position is None:
+            return 0, 0
+        return position[0] - 1, position[1]
 
     def get_sheet_data(self) -> str:
         """Get current sheet data as JSON."""
+        return json.dumps(self._snapshot_sheet())
+
+    def _snapshot_sheet(self) -> Dict[str, Any]:
+        """Collect the current sheet contents into a JSON-serializable dict."""
         cells = {}
         cell_formatting = {}
-        for row in range(self.table.rowCount()):
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                if item and (item.text() or item.data(Qt.ItemDataRole.UserRole)):
-                    cell_ref = self.cell_ref(row, col)
-                    # Save formula if present, otherwise save displayed value
-                    formula = item.data(Qt.ItemDataRole.UserRole)
-                    if formula and formula.startswith('='):
-                        cells[cell_ref] = formula
-                    elif item.text():
-                        cells[cell_ref] = item.text()
-
-                    # Save formatting if non-default
-                    font = item.font()
-                    formatting = {}
-                    if font.bold():
-                        formatting['bold'] = True
-                    if font.italic():
-                        formatting['italic'] = True
-                    if font.underline():
-                        formatting['underline'] = True
-
-                    if formatting:
-                        cell_formatting[cell_ref] = formatting
-
-        # Save column widths (only non-default widths to save space)
-        column_widths = {}
-        for col in range(self.table.columnCount()):
-            width = self.table.columnWidth(col)
-            # Save if different from default (typically 100 pixels)
-            if width != self.table.horizontalHeader().defaultSectionSize():
-                column_widths[str(col)] = width
-
-        # Save row heights (only non-default heights to save space)
-        row_heights = {}
-        for row in range(self.table.rowCount()):
-            height = self.table.rowHeight(row)
-            # Save if different from default (typically 30 pixels)
-            if height != self.table.verticalHeader().defaultSectionSize():
-                row_heights[str(row)] = height
+        user_role = Qt.ItemDataRole.UserRole
+        for row, col, item in self._occupied_items():
+            text = item.text()
+            formula = item.data(user_role)
+            if text or formula:
+                cell_ref = self.cell_ref(row, col)
+                # Save formula if present, otherwise save displayed value
+                if formula and formula.startswith('='):
+                    cells[cell_ref] = formula
+                elif text:
+                    cells[cell_ref] = text
+
+                # Save formatting if non-default (as a FORMAT_* bitmask)
+                font = item.font()
+                formatting = (
+                    (FORMAT_BOLD if font.bold() else 0)
+                    | (FORMAT_ITALIC if font.italic() else 0)
+                    | (FORMAT_UNDERLINE if font.underline() else 0)
+                )
+                if formatting:
+                    cell_formatting[cell_ref] = formatting
+
+        # Save column widths and row heights (only non-default sizes to save space)
+        column_widths = {str(col): width for col, width in sorted(self._custom_col_widths.items())}
+        row_heights = {str(row): height for row, height in sorted(self._custom_row_heights.items())}
 
         # Create complete data structure
-        sheet_data = {
+        return {
             'cells': cells,
             'column_widths': column_widths,
             'row_heights': row_heights,
             'cell_formatting': cell_formatting
         }
 
-        return json.dumps(sheet_data)
-
     def on_cell_selected(self, row, col, prev_row, prev_col):
         """Handle cell selection."""
         item = self.table.item(row, col)
@@ -1020,10 +1612,40 @@ class SpreadsheetWidget(QWidget):
         """Handle column/row header resize."""
         if old_size != new_size:
             self.is_modified = True
+            self._revision += 1
+
+    def on_column_resized(self, index, old_size, new_size):
+        """Record a non-default column width so saving doesn't rescan every column."""
+        if new_size != self.table.horizontalHeader().defaultSectionSize():
+            self._custom_col_widths[index] = new_size
+        else:
+            self._custom_col_widths.pop(index, None)
+        self.on_header_resized(index, old_size, new_size)
+
+    def on_row_resized(self, index, old_size, new_size):
+        """Record a non-default row height so saving doesn't rescan every row."""
+        if new_size != self.table.verticalHeader().defaultSectionSize():
+            self._custom_row_heights[index] = new_size
+        else:
+            self._custom_row_heights.pop(index, None)
+        self.on_header_resized(index, old_size, new_size)
+
+    def _occupied_items(self) -> list:
+        """Return (row, col, item) for every cell holding an item, in row-major order."""
+        item_at = self.table.item
+        occupied = []
+        for row, col in sorted(self._occupied):
+            item = item_at(row, col)
+            if item is not None:
+                occupied.append((row, col, item))
+        return occupied
 
     def on_cell_changed(self, item):
         """Handle cell content change."""
         self.is_modified = True
+        self._revision += 1
+        if item:
+            self._occupied.add((item.row(), item.column()))
         # Store for undo
         self.undo_stack.append(self.get_sheet_data())
         self.redo_stack.clear()
@@ -1064,36 +1686,44 @@ class SpreadsheetWidget(QWidget):
         """Recalculate all formulas."""
         self.table.blockSignals(True)
 
+        user_role = Qt.ItemDataRole.UserRole
+        occupied = self._occupied_items()
+
         # Get all cell values (use stored formulas where available)
         cells = {}
-        for row in range(self.table.rowCount()):
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                if item:
-                    # Check if there's a stored formula in the data
-                    formula = item.data(Qt.ItemDataRole.UserRole)
-                    if formula and formula.startswith('='):
-                        cells[self.cell_ref(row, col)] = formula
-                    else:
-                        cells[self.cell_ref(row, col)] = item.text()
-
-        # Evaluate formulas
-        engine = FormulaEngine(cells)
-        for row in range(self.table.rowCount()):
-            for col in range(self.table.columnCount()):
-                item = self.table.item(row, col)
-                if item:
-                    # Check for formula in UserRole data or in cell text
-                    formula = item.data(Qt.ItemDataRole.UserRole)
-                    if formula is None and item.text().startswith('='):
-                        # First time seeing this formula - store it
-                        formula = item.text()
-                        item.setData(Qt.ItemDataRole.UserRole, formula)
-
-                    if formula and formula.startswith('='):
-                        result = engine.evaluate(formula)
-                        item.setText(str(result))
-                        item.setToolTip(f"Formula: {formula}")
+        refs = []
+        for row, col, item in occupied:
+            cell_ref = self.cell_ref(row, col)
+            refs.append(cell_ref)
+            # Check if there's a stored formula in the data
+            formula = item.data(user_role)
+            if formula and formula.startswith('='):
+                cells[cell_ref] = formula
+            else:
+                cells[cell_ref] = item.text()
+
+        # Evaluate formulas, reusing cached results whose inputs didn't change
+        engine = self._engine
+        if engine is None:
+            engine = self._engine = FormulaEngine(cells)
+        else:
+            engine.update(cells)
+        results = engine.recalc_all()
+        for cell_ref, (row, col, item) in zip(refs, occupied):
+            # Check for formula in UserRole data or in cell text
+            formula = item.data(user_role)
+            if formula is None:
+                text = item.text()
+                if text.startswith('='):
+                    # First time seeing this formula - store it
+                    formula = text
+                    item.setData(user_role, formula)
+
+            if formula and formula.startswith('='):
+                # The engine evaluated the cell's text, which is this formula
+                result = results[cell_ref]
+                item.setText(str(result))
+                item.setToolTip(f"Formula: {formula}")
 
         self.table.blockSignals(False)
 
@@ -1123,6 +1753,7 @@ class SpreadsheetWidget(QWidget):
 
         if ok and new_name and new_name != old_name:
             # Get the sheet from database
+            self.wait_for_pending_saves()
             sheet = self.database.get_spreadsheet(sheet_id)
             if sheet:
                 # Update the sheet with new name
@@ -1162,17 +1793,54 @@ class SpreadsheetWidget(QWidget):
             self.database.delete_spreadsheet(sheet_id)
             self.load_sheets()
             self.table.clearContents()
+            self._occupied.clear()
             self.sheet_modified.emit()
 
     def save_current_sheet(self):
-        """Save the current sheet."""
-        if self.current_sheet_id and self.is_modified:
-            # Use the stored name instead of the currently selected item
-            data = self.get_sheet_data()
-            self.database.update_spreadsheet(self.current_sheet_id, self.current_sheet_name, data)
+        """Save the current sheet.
+
+        The table is snapshotted here on the UI thread; JSON encoding and the
+        database write run on the save pool. The sheet stays modified until
+        the write is reported back, so call wait_for_pending_saves() before
+        reading the sheet back or closing the database.
+        """
+        if not (self.current_sheet_id and self.is_modified):
+            return
+        pending = (self.current_sheet_id, self._revision)
+        if pending == self._queued_save:
+            # This revision is already on its way to the database
+            return
+        # Use the stored name instead of the currently selected item
+        task = SheetSaveTask(
+            self.database, self._save_signals, self.current_sheet_id, self.current_sheet_name,
+            self._snapshot_sheet(), self._revision, self._written
+        )
+        self._queued_save = pending
+        self._save_pool.start(task)
+
+    def wait_for_pending_saves(self):
+        """Block until all queued sheet saves have been written and reported."""
+        self._save_pool.waitForDone()
+        # Deliver the queued saved/failed results now instead of on the next
+        # event loop pass, so callers see the final is_modified state
+        QCoreApplication.sendPostedEvents(None, QEvent.Type.MetaCall)
+
+    def _on_sheet_saved(self, sheet_id: int, revision: int):
+        """Mark the sheet clean once its write has landed, unless it was edited since."""
+        if (sheet_id, revision) == self._queued_save:
+            self._queued_save = None
+        if sheet_id == self.current_sheet_id and revision == self._revision:
             self.is_modified = False
             self.sheet_modified.emit()
 
+    def _on_sheet_save_failed(self, sheet_id: int, revision: int):
+        """Keep the sheet modified after a failed write so the edits are saved again."""
+        if (sheet_id, revision) == self._queued_save:
+            self._queued_save = None
+        if sheet_id == self.current_sheet_id:
+            self.is_modified = True
+            self.sheet_modified.emit()
+
     def autosave(self):
         """Autosave the current sheet if modified."""
         if self.is_modified and self.current_sheet_id:
@@ -1218,16 +1886,22 @@ class SpreadsheetWidget(QWidget):
             return
 
         # Apply to all selected cells
+        item_at = self.table.item
+        set_item = self.table.setItem
+        apply_cell_formatting = self._apply_cell_formatting
         for selected_range in selected_ranges:
+            col_range = range(selected_range.leftColumn(), selected_range.rightColumn() + 1)
             for row in range(selected_range.topRow(), selected_range.bottomRow() + 1):
-                for col in range(selected_range.leftColumn(), selected_range.rightColumn() + 1):
-                    item = self.table.item(row, col)
+                for col in col_range:
+                    item = item_at(row, col)
                     if not item:
                         item = QTableWidgetItem()
-                        self.table.setItem(row, col, item)
-                    self._apply_cell_formatting(item, format_type, enabled)
+                        set_item(row, col, item)
+                        self._occupied.add((row, col))
+                    apply_cell_formatting(item, format_type, enabled)
 
         self.is_modified = True
+        self._revision += 1
         self.sheet_modified.emit()
 
     def _apply_cell_formatting(self, item: QTableWidgetItem, format_type: str, enabled: bool):
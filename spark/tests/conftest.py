@@ -0,0 +1,66 @@
+"""Fixtures shared by the test modules."""
+
+import os
+import sqlite3
+import uuid
+
+import pytest
+
+from spark.database import Database
+
+
+class _SavepointConnection:
+    """Connection proxy whose commit() is a no-op.
+
+    Lets a per-test SAVEPOINT roll back everything the Database wrote.
+    """
+
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+
+    def commit(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+@pytest.fixture(scope="session")
+def schema_template():
+    """Build the schema once per session in an in-memory database."""
+    template = Database(":memory:")
+    yield template.connection
+    template.close()
+
+
+@pytest.fixture(scope="module")
+def shared_db(schema_template):
+    """Create one shared-cache in-memory database, on one connection, for the module.
+
+    The schema is page-copied from the session template with backup(),
+    so Database finds the current schema version and skips its DDL. Every
+    test then shares the one connection Database opens, isolated by the
+    per-test SAVEPOINT in the db fixture.
+    """
+    # Name the database after the xdist worker (if any) so parallel runs never share one
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "main")
+    uri = f"file:spark_test_{worker}_{uuid.uuid4().hex}?mode=memory&cache=shared"
+    # Holds the shared-cache database open until Database connects to it
+    seed = sqlite3.connect(uri, uri=True)
+    schema_template.backup(seed)
+    database = Database(uri)
+    seed.close()
+    # No implicit BEGINs: every statement runs inside the test's savepoint
+    database.connection.isolation_level = None
+    database.connection = _SavepointConnection(database.connection)
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def db(shared_db):
+    """Run each test inside a SAVEPOINT that is rolled back afterwards."""
+    shared_db.connection.execute("SAVEPOINT test")
+    yield shared_db
+    shared_db.connection.execute("ROLLBACK TO test")
+    shared_db.connection.execute("RELEASE test")
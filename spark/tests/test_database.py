@@ -1,28 +1,62 @@
 """Unit tests for Database class."""
 
 import pytest
+import shutil
 import sqlite3
 from pathlib import Path
 from datetime import datetime
 
-from spark.database import Database
+from spark.database import Database, FTS_SCHEMA, SCHEMA_VERSION
+
+
+@pytest.fixture(autouse=True)
+def fast_sqlite(monkeypatch):
+    """Skip journaling and fsyncs on test databases; they are throwaway."""
+    monkeypatch.setenv("SPARK_TEST", "1")
+
+
+@pytest.fixture(scope="session")
+def template_db_file(tmp_path_factory):
+    """Build the schema once per session into an on-disk template database."""
+    path = tmp_path_factory.mktemp("template") / "template.db"
+    Database(path).close()
+    return path
+
+
+@pytest.fixture
+def db_file(tmp_path, template_db_file):
+    """Path to a per-test copy of the on-disk template database."""
+    path = tmp_path / "test_spark.db"
+    shutil.copyfile(template_db_file, path)
+    return path
 
 
 class TestDatabase:
     """Test cases for Database class."""
 
-    @pytest.fixture
-    def db(self, tmp_path):
-        """Create a temporary database for testing."""
-        db_path = tmp_path / "test_spark.db"
-        database = Database(db_path)
-        yield database
-        database.close()
-
-    def test_database_initialization(self, db):
+    def test_database_initialization(self, db_file):
         """Test that database initializes correctly."""
+        db = Database(db_file)
         assert db.connection is not None
         assert db.db_path.exists()
+        db.close()
+
+    def test_test_pragmas_applied(self, db_file):
+        """Test that SPARK_TEST=1 turns off durability on file databases."""
+        db = Database(db_file)
+        cursor = db.connection.cursor()
+        cursor.execute("PRAGMA synchronous")
+        assert cursor.fetchone()[0] == 0
+        cursor.execute("PRAGMA journal_mode")
+        assert cursor.fetchone()[0] == "memory"
+        db.close()
+
+    def test_in_memory_uri_database(self, db):
+        """Test that a URI database is opened in memory without touching disk."""
+        assert db.is_uri
+        cursor = db.connection.cursor()
+        cursor.execute("PRAGMA database_list")
+        assert cursor.fetchone()["file"] == ""
 
     def test_tables_created(self, db):
         """Test that all required tables are created."""
@@ -50,6 +84,23 @@ class TestDatabase:
         assert "idx_notes_title" in indexes
         assert "idx_snippets_title" in indexes
         assert "idx_snippets_language" in indexes
+        assert "idx_notes_parent_title" in indexes
+        assert "idx_snippets_language_title" in indexes
+
+    def test_child_notes_use_index(self, db):
+        """Test that child note lookups range-scan the parent index instead of sorting."""
+        cursor = db.connection.cursor()
+        cursor.execute("EXPLAIN QUERY PLAN SELECT * FROM notes WHERE parent_id = ? ORDER BY title", (1,))
+        plan = " ".join(row["detail"] for row in cursor.fetchall())
+        assert "idx_notes_parent_title" in plan
+        assert "TEMP B-TREE" not in plan
+
+    def test_getters_return_rows(self, db):
+        """Test that getters return sqlite3.Row objects indexable by column name."""
+        note = db.get_note(db.add_note("Row", "Content"))
+        assert isinstance(note, sqlite3.Row)
+        assert note["title"] == "Row"
+        assert dict(note)["content"] == "Content"
 
     # Notes tests
     def test_add_note(self, db):
@@ -108,9 +159,11 @@ class TestDatabase:
 
     def test_get_all_notes(self, db):
         """Test getting all notes."""
-        db.add_note("Note 1")
-        db.add_note("Note 2")
-        db.add_note("Note 3")
+        db.bulk_add_notes([
+            ("Note 1", "", None),
+            ("Note 2", "", None),
+            ("Note 3", "", None),
+        ])
 
         notes = db.get_all_notes()
         assert len(notes) == 3
@@ -143,9 +196,11 @@ class TestDatabase:
 
     def test_search_notes(self, db):
         """Test searching notes."""
-        db.add_note("Python Tutorial", "Learn Python programming")
-        db.add_note("Java Guide", "Java programming basics")
-        db.add_note("JavaScript Tips", "Quick JS tips")
+        db.bulk_add_notes([
+            ("Python Tutorial", "Learn Python programming", None),
+            ("Java Guide", "Java programming basics", None),
+            ("JavaScript Tips", "Quick JS tips", None),
+        ])
 
         # Search by title
         results = db.search_notes("Python")
@@ -160,6 +215,29 @@ class TestDatabase:
         results = db.search_notes("java")
         assert len(results) >= 2  # Java and JavaScript
 
+    def test_search_index_follows_changes(self, db):
+        """Test that the full-text index tracks note updates and deletes."""
+        assert db._has_fts
+        note_id = db.add_note("Groceries", "buy apples")
+        assert [r["id"] for r in db.search_notes("APPLE")] == [note_id]
+
+        db.update_note(note_id, "Groceries", "buy pears")
+        assert db.search_notes("apple") == []
+        assert [r["id"] for r in db.search_notes("pear")] == [note_id]
+
+        db.delete_note(note_id)
+        assert db.search_notes("pear") == []
+
+    def test_search_short_query(self, db):
+        """Test that queries too short for the trigram index still match."""
+        db.add_note("JavaScript Tips", "Quick JS tips")
+        db.add_snippet("Regex", "re.compile('x\"y')", "Python", "re")
+
+        assert len(db.search_notes("js")) == 1
+        assert len(db.search_snippets("re")) == 1
+        # FTS5 query syntax is matched literally
+        assert len(db.search_snippets("'x\"y'")) == 1
+
     # Spreadsheet tests
     def test_add_spreadsheet(self, db):
         """Test adding a spreadsheet."""
@@ -244,18 +322,22 @@ class TestDatabase:
 
     def test_get_all_snippets(self, db):
         """Test getting all snippets."""
-        db.add_snippet("Snippet 1", "code1", "Python")
-        db.add_snippet("Snippet 2", "code2", "JavaScript")
-        db.add_snippet("Snippet 3", "code3", "Python")
+        db.bulk_add_snippets([
+            ("Snippet 1", "code1", "Python", ""),
+            ("Snippet 2", "code2", "JavaScript", ""),
+            ("Snippet 3", "code3", "Python", ""),
+        ])
 
         snippets = db.get_all_snippets()
         assert len(snippets) == 3
 
     def test_get_snippets_by_language(self, db):
         """Test getting snippets by language."""
-        db.add_snippet("Python 1", "code1", "Python")
-        db.add_snippet("JS 1", "code2", "JavaScript")
-        db.add_snippet("Python 2", "code3", "Python")
+        db.bulk_add_snippets([
+            ("Python 1", "code1", "Python", ""),
+            ("JS 1", "code2", "JavaScript", ""),
+            ("Python 2", "code3", "Python", ""),
+        ])
 
         python_snippets = db.get_snippets_by_language("Python")
         assert len(python_snippets) == 2
@@ -268,9 +350,11 @@ class TestDatabase:
 
     def test_search_snippets(self, db):
         """Test searching snippets."""
-        db.add_snippet("Hello World", 'print("Hello")', "Python", "beginner")
-        db.add_snippet("File I/O", 'open("file.txt")', "Python", "file,io")
-        db.add_snippet("Array Methods", "arr.map()", "JavaScript", "array")
+        db.bulk_add_snippets([
+            ("Hello World", 'print("Hello")', "Python", "beginner"),
+            ("File I/O", 'open("file.txt")', "Python", "file,io"),
+            ("Array Methods", "arr.map()", "JavaScript", "array"),
+        ])
 
         # Search by title
         results = db.search_snippets("Hello")
@@ -288,10 +372,9 @@ class TestDatabase:
         file_io_snippets = [r for r in results if r["title"] == "File I/O"]
         assert len(file_io_snippets) == 1
 
-    def test_database_connection_management(self, tmp_path):
+    def test_database_connection_management(self, db_file):
         """Test database connection and closing."""
-        db_path = tmp_path / "test_connection.db"
-        db = Database(db_path)
+        db = Database(db_file)
 
         assert db.connection is not None
         db.close()
@@ -302,7 +385,105 @@ class TestDatabase:
         assert db.connection is not None
         db.close()
 
-    def test_timestamps(self, db):
+    def test_schema_initialized_once(self, db_file):
+        """Test that the schema version is stamped and init is not repeated."""
+        db = Database(db_file)
+        cursor = db.connection.cursor()
+        cursor.execute("PRAGMA user_version")
+        assert cursor.fetchone()[0] == SCHEMA_VERSION
+
+        # A second init after closing does not even reconnect
+        db.close()
+        db.init_database()
+        assert db.connection is None
+
+    def test_search_index_not_stored_in_file(self, db_file):
+        """Test that the synced file holds no FTS tables or triggers."""
+        db = Database(db_file)
+        assert db._has_fts
+        db.close()
+
+        conn = sqlite3.connect(db_file)
+        names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE name LIKE '%fts%'")]
+        conn.close()
+        assert names == []
+
+    def test_search_without_fts_on_current_file(self, db_file, monkeypatch):
+        """Test that a client without FTS5 falls back to LIKE on a file already at the current version."""
+        # Stands in for an SQLite built without the trigram tokenizer
+        monkeypatch.setattr(
+            "spark.database.FTS_SCHEMA",
+            tuple(statement.replace("'trigram'", "'missing'") for statement in FTS_SCHEMA)
+        )
+        db = Database(db_file)
+        assert not db._has_fts
+        note_id = db.add_note("Groceries", "buy apples")
+        assert [r["id"] for r in db.search_notes("apple")] == [note_id]
+        db.close()
+
+    def test_search_index_rebuilt_on_reconnect(self, db_file):
+        """Test that reconnecting rebuilds the per-connection search index."""
+        db = Database(db_file)
+        note_id = db.add_note("Groceries", "buy apples")
+        db.close()
+
+        db.connect()
+        assert db._has_fts
+        assert [r["id"] for r in db.search_notes("apple")] == [note_id]
+        db.close()
+
+    def test_search_index_follows_other_connections(self, db_file, monkeypatch):
+        """Test that search and later writes see changes another connection made to the file."""
+        # The test pragmas hold an exclusive lock, which would block the second writer
+        monkeypatch.delenv("SPARK_TEST")
+        db = Database(db_file)
+        note_id = db.add_note("Animals", "a horse")
+        snippet_id = db.add_snippet("Zoo", "horse()", "Python", "")
+        assert [r["id"] for r in db.search_notes("horse")] == [note_id]
+
+        # e.g. Syncthing bringing in an edit made on another device
+        other = sqlite3.connect(db_file)
+        other.execute("UPDATE notes SET content = 'a zebra' WHERE id = ?", (note_id,))
+        other.execute("UPDATE snippets SET code = 'zebra()' WHERE id = ?", (snippet_id,))
+        other.commit()
+        other.close()
+
+        assert [r["id"] for r in db.search_notes("zebra")] == [note_id]
+        assert db.search_notes("horse") == []
+        assert [r["id"] for r in db.search_snippets("zebra")] == [snippet_id]
+
+        # Local edits after the external one keep the index consistent
+        db.update_note(note_id, "Animals", "a giraffe")
+        assert [r["id"] for r in db.search_notes("giraffe")] == [note_id]
+        assert db.search_notes("zebra") == []
+        db.delete_note(note_id)
+        assert db.search_notes("giraffe") == []
+        db.close()
+
+    def test_legacy_search_index_dropped(self, tmp_path):
+        """Test that search tables and triggers stored by schema version 3 are removed."""
+        path = tmp_path / "old.db"
+        Database(path).close()
+        conn = sqlite3.connect(path)
+        conn.executescript('''
+            CREATE VIRTUAL TABLE notes_fts USING fts5(title, content, content='notes', content_rowid='id');
+            CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN
+                INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END;
+            PRAGMA user_version = 3;
+        ''')
+        conn.close()
+
+        db = Database(path)
+        note_id = db.add_note("Groceries", "buy apples")
+        assert [r["id"] for r in db.search_notes("apple")] == [note_id]
+        db.close()
+
+        conn = sqlite3.connect(path)
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name LIKE 'notes_fts%'").fetchall() == []
+        conn.close()
+
+    def test_timestamps(self, db, monkeypatch):
         """Test that timestamps are set correctly."""
         note_id = db.add_note("Test Note", "Content")
         note = db.get_note(note_id)
@@ -310,13 +491,12 @@ class TestDatabase:
         assert note["created_at"] is not None
         assert note["modified_at"] is not None
 
-        # Update note and check modified_at changes
-        import time
-        time.sleep(1)  # Delay to ensure timestamp difference (seconds resolution)
+        # Update note with a fixed clock instead of waiting for the wall clock to move
+        monkeypatch.setattr(db, "_now", lambda: datetime(2030, 1, 2, 3, 4, 5))
 
         db.update_note(note_id, "Updated", "Updated content")
         updated_note = db.get_note(note_id)
 
-        # Modified time should be different after update
-        # Convert to strings for comparison if needed
+        # Modified time should come from the injected clock
         assert updated_note["modified_at"] != note["modified_at"]
+        assert updated_note["modified_at"] == "2030-01-02 03:04:05"
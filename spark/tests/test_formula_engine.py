@@ -1,8 +1,35 @@
 """Unit tests for FormulaEngine class."""
 
+import sys
 import pytest
 from datetime import datetime
-from spark.spreadsheet_widget import FormulaEngine
+from types import MappingProxyType
+from spark import spreadsheet_widget
+from spark.spreadsheet_widget import FormulaEngine, _compile_formula, _range_refs
+
+
+# Read-only so the one shared copy can't leak changes between tests
+_SAMPLE_CELLS = MappingProxyType({
+    "A1": "10",
+    "A2": "20",
+    "A3": "30",
+    "B1": "5",
+    "B2": "15",
+    "B3": "25",
+    "C1": "=A1+B1",
+})
+
+
+@pytest.fixture(scope="module")
+def sample_cells():
+    """Sample cell mapping for testing."""
+    return _SAMPLE_CELLS
+
+
+@pytest.fixture(scope="module")
+def engine(sample_cells):
+    """One FormulaEngine over sample_cells, shared by the parametrized cases."""
+    return FormulaEngine(sample_cells)
 
 
 class TestFormulaEngine:
@@ -13,112 +40,229 @@ class TestFormulaEngine:
         """Empty cell dictionary for testing."""
         return {}
 
-    @pytest.fixture
-    def sample_cells(self):
-        """Sample cell dictionary for testing."""
-        return {
-            "A1": "10",
-            "A2": "20",
-            "A3": "30",
-            "B1": "5",
-            "B2": "15",
-            "B3": "25",
-            "C1": "=A1+B1",
-        }
-
     def test_non_formula_passthrough(self, empty_cells):
         """Test that non-formula values pass through unchanged."""
         engine = FormulaEngine(empty_cells)
         assert engine.evaluate("Hello") == "Hello"
         assert engine.evaluate("123") == "123"
         assert engine.evaluate("text") == "text"
-
-    def test_basic_arithmetic_formulas(self, empty_cells):
-        """Test basic arithmetic in formulas."""
-        engine = FormulaEngine(empty_cells)
-        assert engine.evaluate("=2+3") == 5
-        assert engine.evaluate("=10-4") == 6
-        assert engine.evaluate("=5*6") == 30
-        assert engine.evaluate("=20/4") == 5
-
-    def test_equality_operator_normalization(self, empty_cells):
+        assert engine.evaluate("") == ""
+        assert engine.evaluate(42) == 42
+
+    @pytest.mark.parametrize("formula,expected", [
+        # Basic arithmetic
+        ("=2+3", 5),
+        ("=10-4", 6),
+        ("=5*6", 30),
+        ("=20/4", 5),
+        # ^ is converted to ** for exponentiation
+        ("=2^8", 256),
+        ("=3^3", 27),
+        # Cell references
+        ("=A1", 10.0),
+        ("=B2", 15.0),
+        ("=A1+B1", 15.0),
+        ("=A2-B1", 15.0),
+        ("=A1*2", 20.0),
+        ("=A1+A2+A3", 60.0),
+        ("=(A1+B1)*2", 30.0),
+        ("=(A1+A2)*B1/2", 75.0),
+        # Formulas in referenced cells are evaluated recursively (C1 = A1+B1)
+        ("=C1*2", 30.0),
+        # SUM
+        ("=SUM(10,20,30)", 60),
+        ("=SUM(A1,A2)", 30),
+        ("=sum(5,10)", 15),
+        ("=SUM(A1:A3)", 60),
+        ("=SUM(B1:B3)", 45),
+        ("=SUM(A1:A2,B1:B2)", 50),
+        # AVERAGE
+        ("=AVERAGE(10,20,30)", 20),
+        ("=AVERAGE(A1,A2,A3)", 20),
+        ("=average(5,15)", 10),
+        ("=AVERAGE(A1:A3)", 20),
+        ("=AVERAGE(B1:B3)", 15),
+        # IF
+        ("=IF(5>3,10,20)", 10),
+        ("=IF(5<3,10,20)", 20),
+        ("=IF(A1>5,100,200)", 100),
+        ("=IF(B1>10,100,200)", 200),
+        ("=IF(A1=10,A2,B2)", 20.0),
+        ("=IF(A1>B1,A1,B1)", 10.0),
+        ("=if(5>3,10,20)", 10),
+        # Spaces
+        ("= A1 + B1 ", 15.0),
+        ("=  SUM( A1 , A2 )  ", 30),
+    ])
+    def test_formula_values(self, engine, formula, expected):
+        """Test formula results against a shared engine over sample_cells."""
+        assert engine.evaluate(formula) == expected
+
+    def test_equality_operator_normalization(self, engine):
         """Test that single = is converted to == in comparisons."""
-        engine = FormulaEngine(empty_cells)
         assert engine.evaluate("=5=5") is True
         assert engine.evaluate("=5=6") is False
         assert engine.evaluate("=10==10") is True
 
-    def test_exponentiation_operator_normalization(self, empty_cells):
-        """Test that ^ is converted to ** for exponentiation."""
-        engine = FormulaEngine(empty_cells)
-        assert engine.evaluate("=2^8") == 256
-        assert engine.evaluate("=3^3") == 27
-
-    def test_cell_references(self, sample_cells):
-        """Test cell reference substitution."""
-        engine = FormulaEngine(sample_cells)
-        assert engine.evaluate("=A1") == 10.0
-        assert engine.evaluate("=B2") == 15.0
-        assert engine.evaluate("=A1+B1") == 15.0
-        assert engine.evaluate("=A2-B1") == 15.0
-
-    def test_cell_reference_in_formula(self, sample_cells):
-        """Test formulas with cell references."""
-        engine = FormulaEngine(sample_cells)
-        assert engine.evaluate("=A1*2") == 20.0
-        assert engine.evaluate("=A1+A2+A3") == 60.0
-        assert engine.evaluate("=(A1+B1)*2") == 30.0
-
-    def test_recursive_formula_evaluation(self, sample_cells):
-        """Test that formulas in cells are evaluated recursively."""
-        engine = FormulaEngine(sample_cells)
-        # C1 contains "=A1+B1", which should evaluate to 15
-        assert engine.evaluate("=C1*2") == 30.0
-
-    def test_sum_function(self, sample_cells):
-        """Test SUM function."""
-        engine = FormulaEngine(sample_cells)
-        assert engine.evaluate("=SUM(10,20,30)") == 60
-        assert engine.evaluate("=SUM(A1,A2)") == 30
-        assert engine.evaluate("=sum(5,10)") == 15  # Case insensitive
-
-    def test_sum_function_with_range(self, sample_cells):
-        """Test SUM function with cell ranges."""
-        engine = FormulaEngine(sample_cells)
-        assert engine.evaluate("=SUM(A1:A3)") == 60
-        assert engine.evaluate("=SUM(B1:B3)") == 45
-
-    def test_average_function(self, sample_cells):
-        """Test AVERAGE function."""
-        engine = FormulaEngine(sample_cells)
-        assert engine.evaluate("=AVERAGE(10,20,30)") == 20
-        assert engine.evaluate("=AVERAGE(A1,A2,A3)") == 20
-        assert engine.evaluate("=average(5,15)") == 10  # Case insensitive
-
-    def test_average_function_with_range(self, sample_cells):
-        """Test AVERAGE function with cell ranges."""
-        engine = FormulaEngine(sample_cells)
-        assert engine.evaluate("=AVERAGE(A1:A3)") == 20
-        assert engine.evaluate("=AVERAGE(B1:B3)") == 15
-
-    def test_if_function(self, sample_cells):
-        """Test IF function."""
-        engine = FormulaEngine(sample_cells)
-        assert engine.evaluate("=IF(5>3,10,20)") == 10
-        assert engine.evaluate("=IF(5<3,10,20)") == 20
-        assert engine.evaluate("=IF(A1>5,100,200)") == 100
-        assert engine.evaluate("=IF(B1>10,100,200)") == 200
-
-    def test_if_function_with_cell_reference(self, sample_cells):
-        """Test IF function with cell references in condition."""
-        engine = FormulaEngine(sample_cells)
-        assert engine.evaluate("=IF(A1=10,A2,B2)") == 20.0
-        assert engine.evaluate("=IF(A1>B1,A1,B1)") == 10.0
+    def test_arithmetic_formulas_compiled(self):
+        """Test that only number/cell-reference formulas take the compiled path."""
+        run, cell_refs = _compile_formula("=(A1+B1)*2^C3")
+        assert cell_refs == ("A1", "B1", "C3")
+        assert run({"A1": 1.0, "B1": 2.0, "C3": 2.0}) == 12.0
+        # Single reference and literal formulas skip eval()
+        run, cell_refs = _compile_formula("=A1")
+        assert cell_refs == ("A1",) and run({"A1": 7.0}) == 7.0
+        run, cell_refs = _compile_formula("= 5")
+        assert cell_refs == () and run({}) == 5
+        assert _compile_formula("=SUM(A1:A3)") is None
+        assert _compile_formula("=PI*2") is None
+        assert _compile_formula('="a" + "b"') is None
+        assert _compile_formula("=A1.real") is None
+        assert _compile_formula("=A1 & B1") is None
+        assert _compile_formula("=~A1") is None
+        # Compiled and text paths report errors the same way
+        engine = FormulaEngine({"A1": "1"})
+        assert engine.evaluate("=A1/0") == engine.evaluate("=SUM(A1)/0")
+
+    @pytest.mark.parametrize("formula,expected", [
+        # A negative cell value is one operand under ^
+        ("=A1^2", 16.0),
+        ("=2^A1", 0.0625),
+        ("=C1^2", 16.0),
+        # Unary minus written in the formula binds looser than ^, as for literals
+        ("=-A1^2", -16.0),
+        ("=-4^2", -16),
+        ("=A1*-B1", -12.0),
+        ("=A1--B1", -7.0),
+    ])
+    def test_negative_operands(self, formula, expected):
+        """Test negative cell values give the same result with and without a function call."""
+        cells = {"A1": "-4", "B1": "-3", "C1": "=A1", "Z1": "0"}
+        # The bare formula is compiled; adding SUM() sends it through the text path
+        assert _compile_formula(formula) is not None
+        assert FormulaEngine(dict(cells)).evaluate(formula) == expected
+        assert FormulaEngine(dict(cells)).evaluate(formula + "+SUM(Z1)") == expected
+        assert FormulaEngine(dict(cells)).evaluate(formula + "+ABS(Z1)") == expected
+
+    @pytest.mark.parametrize("formula,expected", [
+        ("=SUM(A1)^2", 16.0),
+        ("=MIN(A1,B1)^2", 16.0),
+        ("=-SUM(A1)^2", -16.0),
+        ("=IF(A1^2>10,1,0)", 1),
+    ])
+    def test_negative_function_results(self, formula, expected):
+        """Test negative function results and cell values stay one operand in the text path."""
+        engine = FormulaEngine({"A1": "-4", "B1": "-3"})
+        assert engine.evaluate(formula) == expected
+
+    @pytest.mark.parametrize("formula", [
+        "=A1^0.5",
+        "=SUM(A1)^0.5",
+        "=A1^0.5+ABS(Z1)",
+        "=(-4)^0.5",
+    ])
+    def test_negative_base_fractional_power(self, formula):
+        """Test a negative number to a fractional power is an error, not a complex number."""
+        engine = FormulaEngine({"A1": "-4", "Z1": "0"})
+        assert engine.evaluate(formula) == "#ERROR: Invalid expression: math domain error"
+
+    def test_boolean_functions_compiled(self, sample_cells):
+        """Test that AND/OR/NOT become Python boolean operators when compiled."""
+        assert _compile_formula("=AND(A1>5, NOT(A2>50))") is not None
+        assert _compile_formula("=Or(A1, B1)") is not None
+        # Arguments that can raise stay on the text path, which reads them as False
+        assert _compile_formula("=AND(A1/B1>1, True)") is None
+        # Python's own and/or/not aren't treated as the spreadsheet functions
+        assert _compile_formula("=A1>1 and A2>1") is None
+
+        engine = FormulaEngine(sample_cells)
+        assert engine.evaluate("=AND(A1>5, NOT(A2>50))") is True
+        assert engine.evaluate("=OR(A1>50, B1)") is True
+        assert engine.evaluate("=NOT(OR(A1>50, A2>50))") is True
+        assert engine.evaluate("=AND(True, True)+1") == 2
+
+    def test_formula_cells_evaluated_once(self, sample_cells, monkeypatch):
+        """Test that a formula cell referenced several times is only evaluated once."""
+        engine = FormulaEngine(sample_cells)
+        calls = []
+        original = engine.evaluate
+
+        def counting_evaluate(formula):
+            calls.append(formula)
+            return original(formula)
+
+        monkeypatch.setattr(engine, "evaluate", counting_evaluate)
+        assert engine.evaluate("=C1+C1+SUM(C1,C1)") == 60.0
+        assert calls.count("=A1+B1") == 1
+
+    def test_repeated_range_expanded_once(self, sample_cells):
+        """Test that a range used several times in one engine is expanded once."""
+        engine = FormulaEngine(sample_cells)
+        assert engine.evaluate("=SUM(A1:B2)") == 50
+        assert engine.evaluate("=AVERAGE(A1:B2)") == 12.5
+        assert list(engine._range_cache) == ["A1:B2"]
+
+    def test_set_cell_invalidates_dependents(self):
+        """Test that changing a cell recomputes only the formulas that read it."""
+        engine = FormulaEngine({"A1": "1", "B1": "=A1*2", "C1": "=B1+1", "D1": "=SUM(A1:A2)", "E1": "5"})
+        assert engine.evaluate("=C1+D1") == 4.0
+        assert engine.evaluate("=E1") == 5.0
+
+        engine.set_cell("A1", "10")
+        assert "B1" not in engine._cache
+        assert "C1" not in engine._cache
+        assert engine.evaluate("=C1+D1") == 31.0
+
+        engine.set_cell("A2", "5")
+        assert engine.evaluate("=D1") == 15.0
+
+        engine.set_cell("A2", None)
+        assert "A2" not in engine.cells
+        assert engine.evaluate("=D1") == 10.0
+
+    def test_cell_numbers_converted_once(self):
+        """Test that cell values are converted to numbers once until they change."""
+        engine = FormulaEngine({"A1": "2", "A2": "text", "B1": "=A1*3"})
+        assert engine.evaluate("=A1+A2+B1") == 8.0
+        assert engine._numbers == {"A1": 2.0, "A2": None, "B1": 6.0}
+
+        engine.set_cell("A1", "4")
+        assert engine._numbers == {"A2": None}
+        assert engine.evaluate("=SUM(A1:A2)+B1") == 16.0
+
+    def test_recalc_all(self):
+        """Test evaluating every formula cell at once, cycles included."""
+        engine = FormulaEngine({
+            "A1": "2", "A2": "=A1*2", "A3": "=SUM(A1:A2)", "B1": "=A3+A2",
+            "C1": "=C2", "C2": "=C1", "D1": "=C1+1", "E1": "text",
+        })
+        assert engine.recalc_all() == {
+            "A2": 4.0, "A3": 6.0, "B1": 10.0,
+            "C1": "#CYCLE!", "C2": "#CYCLE!", "D1": "#CYCLE!",
+        }
 
-    def test_if_function_case_insensitive(self, sample_cells):
-        """Test IF function is case insensitive."""
-        engine = FormulaEngine(sample_cells)
-        assert engine.evaluate("=if(5>3,10,20)") == 10
+    def test_recalc_all_long_chain(self):
+        """Test that a long chain of references doesn't recurse through every link."""
+        cells = {"A1": "1"}
+        for row in range(2, 3001):
+            cells[f"A{row}"] = f"=A{row - 1}+1"
+        results = FormulaEngine(cells).recalc_all()
+        assert results["A3000"] == 3000.0
+
+    def test_update_invalidates_changed_cells_only(self):
+        """Test that update() keeps cached results whose inputs are unchanged."""
+        engine = FormulaEngine({"A1": "1", "B1": "=A1+1", "C1": "2", "D1": "=C1+1"})
+        assert engine.evaluate("=B1+D1") == 5.0
+
+        engine.update({"A1": "1", "B1": "=A1+1", "C1": "7", "D1": "=C1+1"})
+        assert engine._cache == {"B1": 2.0}
+        assert engine.evaluate("=B1+D1") == 10.0
+
+    def test_circular_reference(self):
+        """Test that circular references report #CYCLE! instead of recursing forever."""
+        engine = FormulaEngine({"A1": "=B1+1", "B1": "=A1+1", "C1": "=C1"})
+        assert engine.evaluate("=A1") == "#CYCLE!"
+        assert engine.evaluate("=C1*2") == "#CYCLE!"
 
     def test_today_function(self, empty_cells):
         """Test TODAY function returns a numeric timestamp."""
@@ -136,6 +280,25 @@ class TestFormulaEngine:
         assert isinstance(result, (int, float))
         assert result > 0
 
+    def test_today_cached_until_midnight(self, monkeypatch):
+        """Test that TODAY's value is reused until the next local midnight."""
+        # A fixed clock instead of the wall clock, which could pass midnight mid-test
+        clock = [datetime(2030, 1, 2, 23, 59, 59).timestamp()]
+        monkeypatch.setattr(spreadsheet_widget, "_time", lambda: clock[0])
+        monkeypatch.setattr(spreadsheet_widget, "_today_cache", (0.0, float("-inf")))
+        jan_2 = datetime(2030, 1, 2).timestamp() / 86400
+        assert spreadsheet_widget._today_days() == jan_2
+
+        # A stale cached value is kept while it hasn't expired...
+        monkeypatch.setattr(spreadsheet_widget, "_today_cache", (1.0, float("inf")))
+        assert spreadsheet_widget._today_days() == 1.0
+        # ...and recomputed once it has
+        monkeypatch.setattr(spreadsheet_widget, "_today_cache", (1.0, 0.0))
+        assert spreadsheet_widget._today_days() == jan_2
+        # Two seconds later it is the next day
+        clock[0] += 2
+        assert spreadsheet_widget._today_days() == datetime(2030, 1, 3).timestamp() / 86400
+
     def test_today_and_now_difference(self, empty_cells):
         """Test that NOW is greater than TODAY (same day but includes time)."""
         engine = FormulaEngine(empty_cells)
@@ -181,20 +344,6 @@ class TestFormulaEngine:
         assert engine.evaluate("=NOT(True)") is False
         assert engine.evaluate("=NOT(False)") is True
 
-    def test_complex_formula(self, sample_cells):
-        """Test complex formulas with multiple operations."""
-        engine = FormulaEngine(sample_cells)
-        # (A1 + A2) * B1 / 2 = (10 + 20) * 5 / 2 = 75
-        assert engine.evaluate("=(A1+A2)*B1/2") == 75.0
-
-    def test_nested_functions(self, sample_cells):
-        """Test nested functions with cell ranges."""
-        engine = FormulaEngine(sample_cells)
-        # Test SUM with multiple ranges
-        result = engine.evaluate("=SUM(A1:A2,B1:B2)")
-        # A1=10, A2=20, B1=5, B2=15 -> SUM=50
-        assert result == 50
-
     def test_cell_range_expansion(self):
         """Test cell range expansion."""
         cells = {
@@ -216,18 +365,49 @@ class TestFormulaEngine:
         engine = FormulaEngine(cells)
         assert engine.evaluate("=SUM(A1:B2)") == 10
 
+    def test_range_refs(self):
+        """Test range expansion into cell references, shared across engines."""
+        assert _range_refs("A1:B2") == ("A1", "B1", "A2", "B2")
+        assert _range_refs("C3:C3") == ("C3",)
+        assert _range_refs("not a range") == ()
+        assert _range_refs("A1:B2") is _range_refs("A1:B2")
+        assert _range_refs("D4:D5")[0] is sys.intern("D4")
+
+    def test_set_cell_keeps_unrelated_ranges(self):
+        """Test that changing a cell only drops the cached ranges that cover it."""
+        engine = FormulaEngine({"A1": "1", "A2": "2", "B1": "3", "B2": "4", "C1": "=SUM(A1:A2)"})
+        assert engine.evaluate("=C1+SUM(B1:B2)") == 10.0
+
+        engine.set_cell("B2", "5")
+        assert list(engine._range_cache) == ["A1:A2"]
+        assert engine._cache == {"C1": 3.0}
+        assert engine.evaluate("=C1+SUM(B1:B2)") == 11.0
+
+        engine.set_cell("A2", "7")
+        assert list(engine._range_cache) == ["B1:B2"]
+        assert engine.evaluate("=C1+SUM(B1:B2)") == 16.0
+
+    def test_range_of_formulas_invalidated(self):
+        """Test that a cached range holding a formula result follows that formula's inputs."""
+        engine = FormulaEngine({"A1": "1", "A2": "=B1*2", "B1": "3"})
+        assert engine.evaluate("=SUM(A1:A2)") == 7.0
+
+        engine.set_cell("B1", "4")
+        assert engine._range_cache == {}
+        assert engine.evaluate("=SUM(A1:A2)") == 9.0
+
+    def test_range_across_multi_letter_columns(self):
+        """Test a range spanning single- and double-letter columns."""
+        engine = FormulaEngine({"Z1": "1", "AA1": "2", "AB1": "3"})
+        assert engine.evaluate("=SUM(Z1:AB1)") == 6
+        assert engine.evaluate("=SUM(AA1:AB1)") == 5
+
     def test_empty_cell_references(self, empty_cells):
         """Test that empty cell references default to 0."""
         engine = FormulaEngine(empty_cells)
         assert engine.evaluate("=A1+5") == 5.0
         assert engine.evaluate("=SUM(A1,A2,A3)") == 0
 
-    def test_formula_with_spaces(self, sample_cells):
-        """Test formulas with spaces."""
-        engine = FormulaEngine(sample_cells)
-        assert engine.evaluate("= A1 + B1 ") == 15.0
-        assert engine.evaluate("=  SUM( A1 , A2 )  ") == 30
-
     def test_error_handling(self, empty_cells):
         """Test error handling for invalid formulas."""
         engine = FormulaEngine(empty_cells)
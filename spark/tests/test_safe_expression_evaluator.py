@@ -1,251 +1,399 @@
 """Unit tests for SafeExpressionEvaluator class."""
 
+import math
 import pytest
-from spark.spreadsheet_widget import SafeExpressionEvaluator
+from spark.spreadsheet_widget import SafeExpressionEvaluator, _compile_expression
+
+
+@pytest.fixture(scope="session")
+def evaluate():
+    """SafeExpressionEvaluator.evaluate, looked up once for every test."""
+    return SafeExpressionEvaluator.evaluate
 
 
 class TestSafeExpressionEvaluator:
     """Test cases for SafeExpressionEvaluator class."""
 
-    def test_basic_arithmetic(self):
+    @pytest.mark.parametrize("expr,expected", [
+        ("2 + 3", 5),
+        ("10 - 4", 6),
+        ("5 * 6", 30),
+        ("20 / 4", 5),
+        ("7 + 3 * 2", 13),  # Order of operations
+    ])
+    def test_basic_arithmetic(self, evaluate, expr, expected):
         """Test basic arithmetic operations."""
-        assert SafeExpressionEvaluator.evaluate("2 + 3") == 5
-        assert SafeExpressionEvaluator.evaluate("10 - 4") == 6
-        assert SafeExpressionEvaluator.evaluate("5 * 6") == 30
-        assert SafeExpressionEvaluator.evaluate("20 / 4") == 5
-        assert SafeExpressionEvaluator.evaluate("7 + 3 * 2") == 13  # Order of operations
+        assert evaluate(expr) == expected
 
-    def test_floor_division(self):
+    @pytest.mark.parametrize("expr,expected", [
+        ("17 // 5", 3),
+        ("20 // 6", 3),
+    ])
+    def test_floor_division(self, evaluate, expr, expected):
         """Test floor division operator."""
-        assert SafeExpressionEvaluator.evaluate("17 // 5") == 3
-        assert SafeExpressionEvaluator.evaluate("20 // 6") == 3
+        assert evaluate(expr) == expected
 
-    def test_modulo(self):
+    @pytest.mark.parametrize("expr,expected", [
+        ("17 % 5", 2),
+        ("20 % 6", 2),
+    ])
+    def test_modulo(self, evaluate, expr, expected):
         """Test modulo operator."""
-        assert SafeExpressionEvaluator.evaluate("17 % 5") == 2
-        assert SafeExpressionEvaluator.evaluate("20 % 6") == 2
-
-    def test_exponentiation(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("2 ** 8", 256),
+        ("3 ** 3", 27),
+        ("5 ** 2", 25),
+    ])
+    def test_exponentiation(self, evaluate, expr, expected):
         """Test exponentiation operator."""
-        assert SafeExpressionEvaluator.evaluate("2 ** 8") == 256
-        assert SafeExpressionEvaluator.evaluate("3 ** 3") == 27
-        assert SafeExpressionEvaluator.evaluate("5 ** 2") == 25
-
-    def test_unary_operators(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("-5", -5),
+        ("+10", 10),
+        ("-(3 + 2)", -5),
+    ])
+    def test_unary_operators(self, evaluate, expr, expected):
         """Test unary operators."""
-        assert SafeExpressionEvaluator.evaluate("-5") == -5
-        assert SafeExpressionEvaluator.evaluate("+10") == 10
-        assert SafeExpressionEvaluator.evaluate("-(3 + 2)") == -5
-
-    def test_parentheses(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("(2 + 3) * 4", 20),
+        ("2 + (3 * 4)", 14),
+        ("((5 + 3) * 2) / 4", 4),
+    ])
+    def test_parentheses(self, evaluate, expr, expected):
         """Test parentheses for grouping."""
-        assert SafeExpressionEvaluator.evaluate("(2 + 3) * 4") == 20
-        assert SafeExpressionEvaluator.evaluate("2 + (3 * 4)") == 14
-        assert SafeExpressionEvaluator.evaluate("((5 + 3) * 2) / 4") == 4
-
-    def test_comparison_operators(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("5 == 5", True),
+        ("5 == 6", False),
+        ("5 != 6", True),
+        ("5 != 5", False),
+        ("5 < 6", True),
+        ("5 < 5", False),
+        ("5 <= 5", True),
+        ("5 > 4", True),
+        ("5 >= 5", True),
+    ])
+    def test_comparison_operators(self, evaluate, expr, expected):
         """Test comparison operators."""
-        assert SafeExpressionEvaluator.evaluate("5 == 5") is True
-        assert SafeExpressionEvaluator.evaluate("5 == 6") is False
-        assert SafeExpressionEvaluator.evaluate("5 != 6") is True
-        assert SafeExpressionEvaluator.evaluate("5 != 5") is False
-        assert SafeExpressionEvaluator.evaluate("5 < 6") is True
-        assert SafeExpressionEvaluator.evaluate("5 < 5") is False
-        assert SafeExpressionEvaluator.evaluate("5 <= 5") is True
-        assert SafeExpressionEvaluator.evaluate("5 > 4") is True
-        assert SafeExpressionEvaluator.evaluate("5 >= 5") is True
-
-    def test_boolean_operators(self):
+        assert evaluate(expr) is expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("True and True", True),
+        ("True and False", False),
+        ("False and False", False),
+        ("True or False", True),
+        ("False or False", False),
+        ("True or True", True),
+    ])
+    def test_boolean_operators(self, evaluate, expr, expected):
         """Test boolean operators."""
-        assert SafeExpressionEvaluator.evaluate("True and True") is True
-        assert SafeExpressionEvaluator.evaluate("True and False") is False
-        assert SafeExpressionEvaluator.evaluate("False and False") is False
-        assert SafeExpressionEvaluator.evaluate("True or False") is True
-        assert SafeExpressionEvaluator.evaluate("False or False") is False
-        assert SafeExpressionEvaluator.evaluate("True or True") is True
-
-    def test_combined_boolean_comparison(self):
+        assert evaluate(expr) is expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("5 > 3 and 10 < 20", True),
+        ("5 > 10 or 20 > 15", True),
+        ("5 > 10 and 20 > 15", False),
+    ])
+    def test_combined_boolean_comparison(self, evaluate, expr, expected):
         """Test combining comparisons with boolean operators."""
-        assert SafeExpressionEvaluator.evaluate("5 > 3 and 10 < 20") is True
-        assert SafeExpressionEvaluator.evaluate("5 > 10 or 20 > 15") is True
-        assert SafeExpressionEvaluator.evaluate("5 > 10 and 20 > 15") is False
-
-    def test_complex_expressions(self):
+        assert evaluate(expr) is expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("(2 + 3) * (4 - 1)", 15),
+        ("2 ** 3 + 4 * 5", 28),
+        ("(10 + 5) / 3", 5),
+    ])
+    def test_complex_expressions(self, evaluate, expr, expected):
         """Test complex nested expressions."""
-        assert SafeExpressionEvaluator.evaluate("(2 + 3) * (4 - 1)") == 15
-        assert SafeExpressionEvaluator.evaluate("2 ** 3 + 4 * 5") == 28
-        assert SafeExpressionEvaluator.evaluate("(10 + 5) / 3") == 5
-
-    def test_floating_point(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("2.5 + 3.5", 6.0),
+        ("10.0 / 4.0", 2.5),
+        ("3.14 * 2", pytest.approx(6.28)),
+    ])
+    def test_floating_point(self, evaluate, expr, expected):
         """Test floating point operations."""
-        assert SafeExpressionEvaluator.evaluate("2.5 + 3.5") == 6.0
-        assert SafeExpressionEvaluator.evaluate("10.0 / 4.0") == 2.5
-        assert SafeExpressionEvaluator.evaluate("3.14 * 2") == pytest.approx(6.28)
+        assert evaluate(expr) == expected
 
-    def test_string_literals(self):
+    @pytest.mark.parametrize("expr,expected", [
+        ('"hello"', "hello"),
+        ("'world'", "world"),
+    ])
+    def test_string_literals(self, evaluate, expr, expected):
         """Test string literal support."""
-        assert SafeExpressionEvaluator.evaluate('"hello"') == "hello"
-        assert SafeExpressionEvaluator.evaluate("'world'") == "world"
+        assert evaluate(expr) == expected
 
-    def test_string_concatenation(self):
-        """Test string concatenation with + operator."""
-        assert SafeExpressionEvaluator.evaluate('"hello" + " " + "world"') == "hello world"
-        assert SafeExpressionEvaluator.evaluate('"foo" + "bar"') == "foobar"
-        assert SafeExpressionEvaluator.evaluate('"test" + " " + "123"') == "test 123"
+    @pytest.mark.parametrize("expr,expected", [
+        ('"hello" + " " + "world"', "hello world"),
+        ('"foo" + "bar"', "foobar"),
+        ('"test" + " " + "123"', "test 123"),
         # Mixed quotes
-        assert SafeExpressionEvaluator.evaluate("'hello' + ' ' + 'world'") == "hello world"
-
-    def test_invalid_expressions(self):
+        ("'hello' + ' ' + 'world'", "hello world"),
+    ])
+    def test_string_concatenation(self, evaluate, expr, expected):
+        """Test string concatenation with + operator."""
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr", [
+        "invalid expression",
+        "import os",  # Not allowed
+        "5 + ",  # Incomplete
+    ])
+    def test_invalid_expressions(self, evaluate, expr):
         """Test that invalid expressions raise errors."""
         with pytest.raises(ValueError):
-            SafeExpressionEvaluator.evaluate("invalid expression")
+            evaluate(expr)
 
-        with pytest.raises(ValueError):
-            SafeExpressionEvaluator.evaluate("import os")  # Not allowed
-
-        with pytest.raises(ValueError):
-            SafeExpressionEvaluator.evaluate("5 + ")  # Incomplete
-
-    def test_chained_comparisons_not_supported(self):
+    def test_chained_comparisons_not_supported(self, evaluate):
         """Test that chained comparisons raise an error."""
         with pytest.raises(ValueError, match="Chained comparisons not supported"):
-            SafeExpressionEvaluator.evaluate("5 < 10 < 15")
-
-    def test_unsupported_operations(self):
+            evaluate("5 < 10 < 15")
+
+    @pytest.mark.parametrize("expr", [
+        "[1, 2, 3]",  # List literals not supported
+        "{'key': 'value'}",  # Dictionary literals not supported
+        "func()",  # Function calls not supported
+    ])
+    def test_unsupported_operations(self, evaluate, expr):
         """Test that unsupported operations raise errors."""
-        # List literals not supported
         with pytest.raises(ValueError):
-            SafeExpressionEvaluator.evaluate("[1, 2, 3]")
+            evaluate(expr)
 
-        # Dictionary literals not supported
-        with pytest.raises(ValueError):
-            SafeExpressionEvaluator.evaluate("{'key': 'value'}")
-
-        # Function calls not supported
-        with pytest.raises(ValueError):
-            SafeExpressionEvaluator.evaluate("func()")
-
-    def test_division_by_zero(self):
+    def test_division_by_zero(self, evaluate):
         """Test division by zero raises error."""
         with pytest.raises(Exception):  # ZeroDivisionError wrapped in ValueError
-            SafeExpressionEvaluator.evaluate("10 / 0")
-
-    def test_boolean_constants(self):
+            evaluate("10 / 0")
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("True", True),
+        ("False", False),
+        ("None", None),
+    ])
+    def test_boolean_constants(self, evaluate, expr, expected):
         """Test True/False/None constants."""
-        assert SafeExpressionEvaluator.evaluate("True") is True
-        assert SafeExpressionEvaluator.evaluate("False") is False
-        assert SafeExpressionEvaluator.evaluate("None") is None
-
-    def test_operator_precedence(self):
+        assert evaluate(expr) is expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("2 + 3 * 4", 14),
+        ("2 * 3 + 4", 10),
+        ("2 ** 3 ** 2", 512),  # Right-associative
+        ("10 - 5 - 2", 3),  # Left-associative
+    ])
+    def test_operator_precedence(self, evaluate, expr, expected):
         """Test operator precedence is correct."""
-        assert SafeExpressionEvaluator.evaluate("2 + 3 * 4") == 14
-        assert SafeExpressionEvaluator.evaluate("2 * 3 + 4") == 10
-        assert SafeExpressionEvaluator.evaluate("2 ** 3 ** 2") == 512  # Right-associative
-        assert SafeExpressionEvaluator.evaluate("10 - 5 - 2") == 3  # Left-associative
-
-    def test_negative_numbers(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("-10 + 5", -5),
+        ("5 * -2", -10),
+        ("-3 ** 2", -9),  # Unary minus has lower precedence
+    ])
+    def test_negative_numbers(self, evaluate, expr, expected):
         """Test negative number handling."""
-        assert SafeExpressionEvaluator.evaluate("-10 + 5") == -5
-        assert SafeExpressionEvaluator.evaluate("5 * -2") == -10
-        assert SafeExpressionEvaluator.evaluate("-3 ** 2") == -9  # Unary minus has lower precedence
-
-    def test_zero_operations(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("0 + 5", 5),
+        ("5 * 0", 0),
+        ("0 ** 5", 0),
+        ("5 - 0", 5),
+    ])
+    def test_zero_operations(self, evaluate, expr, expected):
         """Test operations with zero."""
-        assert SafeExpressionEvaluator.evaluate("0 + 5") == 5
-        assert SafeExpressionEvaluator.evaluate("5 * 0") == 0
-        assert SafeExpressionEvaluator.evaluate("0 ** 5") == 0
-        assert SafeExpressionEvaluator.evaluate("5 - 0") == 5
-
-    def test_abs_function(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("abs(-5)", 5),
+        ("abs(5)", 5),
+        ("abs(-5.7)", 5.7),
+        ("abs(0)", 0),
+    ])
+    def test_abs_function(self, evaluate, expr, expected):
         """Test abs() function."""
-        assert SafeExpressionEvaluator.evaluate("abs(-5)") == 5
-        assert SafeExpressionEvaluator.evaluate("abs(5)") == 5
-        assert SafeExpressionEvaluator.evaluate("abs(-5.7)") == 5.7
-        assert SafeExpressionEvaluator.evaluate("abs(0)") == 0
-
-    def test_floor_function(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("floor(3.14159)", 3),
+        ("floor(3.9)", 3),
+        ("floor(-2.5)", -3),
+        ("floor(5)", 5),
+    ])
+    def test_floor_function(self, evaluate, expr, expected):
         """Test floor() function."""
-        assert SafeExpressionEvaluator.evaluate("floor(3.14159)") == 3
-        assert SafeExpressionEvaluator.evaluate("floor(3.9)") == 3
-        assert SafeExpressionEvaluator.evaluate("floor(-2.5)") == -3
-        assert SafeExpressionEvaluator.evaluate("floor(5)") == 5
-
-    def test_ceil_function(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("ceil(3.14159)", 4),
+        ("ceil(3.1)", 4),
+        ("ceil(-2.5)", -2),
+        ("ceil(5)", 5),
+    ])
+    def test_ceil_function(self, evaluate, expr, expected):
         """Test ceil() function."""
-        assert SafeExpressionEvaluator.evaluate("ceil(3.14159)") == 4
-        assert SafeExpressionEvaluator.evaluate("ceil(3.1)") == 4
-        assert SafeExpressionEvaluator.evaluate("ceil(-2.5)") == -2
-        assert SafeExpressionEvaluator.evaluate("ceil(5)") == 5
-
-    def test_round_function(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("round(3.14159)", 3),
+        ("round(3.6)", 4),
+        ("round(3.14159, 2)", pytest.approx(3.14)),
+        ("round(3.5)", 4),
+    ])
+    def test_round_function(self, evaluate, expr, expected):
         """Test round() function."""
-        assert SafeExpressionEvaluator.evaluate("round(3.14159)") == 3
-        assert SafeExpressionEvaluator.evaluate("round(3.6)") == 4
-        assert SafeExpressionEvaluator.evaluate("round(3.14159, 2)") == pytest.approx(3.14)
-        assert SafeExpressionEvaluator.evaluate("round(3.5)") == 4
-
-    def test_sqrt_function(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("sqrt(16)", 4),
+        ("sqrt(25)", 5),
+        ("sqrt(2)", pytest.approx(1.41421, rel=1e-5)),
+        ("sqrt(0)", 0),
+    ])
+    def test_sqrt_function(self, evaluate, expr, expected):
         """Test sqrt() function."""
-        assert SafeExpressionEvaluator.evaluate("sqrt(16)") == 4
-        assert SafeExpressionEvaluator.evaluate("sqrt(25)") == 5
-        assert SafeExpressionEvaluator.evaluate("sqrt(2)") == pytest.approx(1.41421, rel=1e-5)
-        assert SafeExpressionEvaluator.evaluate("sqrt(0)") == 0
-
-    def test_pow_function(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("pow(2, 3)", 8),
+        ("pow(5, 2)", 25),
+        ("pow(10, 0)", 1),
+        ("pow(2, -1)", 0.5),
+    ])
+    def test_pow_function(self, evaluate, expr, expected):
         """Test pow() function."""
-        assert SafeExpressionEvaluator.evaluate("pow(2, 3)") == 8
-        assert SafeExpressionEvaluator.evaluate("pow(5, 2)") == 25
-        assert SafeExpressionEvaluator.evaluate("pow(10, 0)") == 1
-        assert SafeExpressionEvaluator.evaluate("pow(2, -1)") == 0.5
-
-    def test_min_max_functions(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("min(5, 10)", 5),
+        ("min(10, 5)", 5),
+        ("min(3, 1, 4, 1, 5, 9)", 1),
+        ("max(5, 10)", 10),
+        ("max(10, 5)", 10),
+        ("max(3, 1, 4, 1, 5, 9)", 9),
+    ])
+    def test_min_max_functions(self, evaluate, expr, expected):
         """Test min() and max() functions."""
-        assert SafeExpressionEvaluator.evaluate("min(5, 10)") == 5
-        assert SafeExpressionEvaluator.evaluate("min(10, 5)") == 5
-        assert SafeExpressionEvaluator.evaluate("min(3, 1, 4, 1, 5, 9)") == 1
-        assert SafeExpressionEvaluator.evaluate("max(5, 10)") == 10
-        assert SafeExpressionEvaluator.evaluate("max(10, 5)") == 10
-        assert SafeExpressionEvaluator.evaluate("max(3, 1, 4, 1, 5, 9)") == 9
-
-    def test_trigonometric_functions(self):
-        """Test trigonometric functions."""
-        assert SafeExpressionEvaluator.evaluate("sin(0)") == 0
-        assert SafeExpressionEvaluator.evaluate("cos(0)") == 1
-        assert SafeExpressionEvaluator.evaluate("tan(0)") == 0
-        # Test with pi
-        import math
-        assert SafeExpressionEvaluator.evaluate("sin(pi / 2)") == pytest.approx(1, rel=1e-10)
-        assert SafeExpressionEvaluator.evaluate("cos(pi)") == pytest.approx(-1, rel=1e-10)
+        assert evaluate(expr) == expected
 
-    def test_logarithmic_functions(self):
+    @pytest.mark.parametrize("expr,expected", [
+        ("sin(0)", 0),
+        ("cos(0)", 1),
+        ("tan(0)", 0),
+        # Test with pi
+        ("sin(pi / 2)", pytest.approx(1, rel=1e-10)),
+        ("cos(pi)", pytest.approx(-1, rel=1e-10)),
+    ])
+    def test_trigonometric_functions(self, evaluate, expr, expected):
+        """Test trigonometric functions."""
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("log(e)", pytest.approx(1, rel=1e-10)),
+        ("log10(100)", 2),
+        ("log10(1000)", 3),
+        ("exp(0)", 1),
+        ("exp(1)", pytest.approx(math.e, rel=1e-10)),
+    ])
+    def test_logarithmic_functions(self, evaluate, expr, expected):
         """Test logarithmic functions."""
-        import math
-        assert SafeExpressionEvaluator.evaluate("log(e)") == pytest.approx(1, rel=1e-10)
-        assert SafeExpressionEvaluator.evaluate("log10(100)") == 2
-        assert SafeExpressionEvaluator.evaluate("log10(1000)") == 3
-        assert SafeExpressionEvaluator.evaluate("exp(0)") == 1
-        assert SafeExpressionEvaluator.evaluate("exp(1)") == pytest.approx(math.e, rel=1e-10)
-
-    def test_math_constants(self):
-        """Test math constants (pi, e, tau)."""
-        import math
-        assert SafeExpressionEvaluator.evaluate("pi") == pytest.approx(math.pi)
-        assert SafeExpressionEvaluator.evaluate("e") == pytest.approx(math.e)
-        assert SafeExpressionEvaluator.evaluate("tau") == pytest.approx(math.tau)
-        # Test using constants in expressions
-        assert SafeExpressionEvaluator.evaluate("2 * pi") == pytest.approx(2 * math.pi)
-        assert SafeExpressionEvaluator.evaluate("pi / 2") == pytest.approx(math.pi / 2)
+        assert evaluate(expr) == expected
 
-    def test_nested_math_functions(self):
+    @pytest.mark.parametrize("expr,expected", [
+        ("pi", pytest.approx(math.pi)),
+        ("e", pytest.approx(math.e)),
+        ("tau", pytest.approx(math.tau)),
+        # Test using constants in expressions
+        ("2 * pi", pytest.approx(2 * math.pi)),
+        ("pi / 2", pytest.approx(math.pi / 2)),
+    ])
+    def test_math_constants(self, evaluate, expr, expected):
+        """Test math constants (pi, e, tau)."""
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("abs(floor(-3.7))", 4),
+        ("sqrt(abs(-16))", 4),
+        ("round(sqrt(50))", 7),
+        ("max(abs(-5), sqrt(9))", 5),
+    ])
+    def test_nested_math_functions(self, evaluate, expr, expected):
         """Test nested math functions."""
-        assert SafeExpressionEvaluator.evaluate("abs(floor(-3.7))") == 4
-        assert SafeExpressionEvaluator.evaluate("sqrt(abs(-16))") == 4
-        assert SafeExpressionEvaluator.evaluate("round(sqrt(50))") == 7
-        assert SafeExpressionEvaluator.evaluate("max(abs(-5), sqrt(9))") == 5
-
-    def test_math_functions_with_expressions(self):
+        assert evaluate(expr) == expected
+
+    @pytest.mark.parametrize("expr,expected", [
+        ("abs(5 - 10)", 5),
+        ("sqrt(16 + 9)", 5),
+        ("floor(pi * 2)", 6),
+        ("max(2 + 3, 4 * 2)", 8),
+    ])
+    def test_math_functions_with_expressions(self, evaluate, expr, expected):
         """Test math functions with complex expressions as arguments."""
-        assert SafeExpressionEvaluator.evaluate("abs(5 - 10)") == 5
-        assert SafeExpressionEvaluator.evaluate("sqrt(16 + 9)") == 5
-        assert SafeExpressionEvaluator.evaluate("floor(pi * 2)") == 6
-        assert SafeExpressionEvaluator.evaluate("max(2 + 3, 4 * 2)") == 8
+        assert evaluate(expr) == expected
+
+    def test_parsed_expressions_are_cached(self, evaluate):
+        """Test that repeated expressions reuse the compiled expression."""
+        _compile_expression.cache_clear()
+        assert evaluate("(1 + 2) * 3") == 9
+        assert evaluate("(1 + 2) * 3") == 9
+        assert _compile_expression.cache_info().hits == 1
+
+    def test_constant_expressions_folded(self, evaluate, monkeypatch):
+        """Test that an expression's functions run once, when it is first compiled."""
+        calls = []
+
+        def counting_sqrt(x):
+            calls.append(x)
+            return x ** 0.5
+
+        monkeypatch.setitem(SafeExpressionEvaluator.MATH_FUNCTIONS, "sqrt", counting_sqrt)
+        _compile_expression.cache_clear()
+        for _ in range(3):
+            assert evaluate("sqrt(16 + 9) * 2") == 10
+        assert calls == [25]
+        # Expressions that fail raise on every evaluation
+        for _ in range(2):
+            with pytest.raises(ValueError, match="math domain error"):
+                evaluate("log(0)")
+        _compile_expression.cache_clear()
+
+    def test_evaluate_many(self, evaluate):
+        """Test evaluating one expression against several rows of variables."""
+        rows = [{"x": 1, "y": 2}, {"x": 3, "y": 4}, {"x": -5, "y": 5}]
+        assert SafeExpressionEvaluator.evaluate_many("x * 10 + y", rows) == [12, 34, -45]
+        assert SafeExpressionEvaluator.evaluate_many("abs(x) > y", rows) == [False, False, False]
+        # Math constants can't be overridden by a row
+        assert SafeExpressionEvaluator.evaluate_many("pi", [{"pi": 3}]) == [pytest.approx(3.14159, rel=1e-5)]
+        assert SafeExpressionEvaluator.evaluate_many("x", []) == []
+        with pytest.raises(ValueError, match="Unknown constant or variable: y"):
+            SafeExpressionEvaluator.evaluate_many("x + y", [{"x": 1}])
+        # Plain evaluate() has no variables
+        with pytest.raises(ValueError, match="Unknown constant or variable: x"):
+            evaluate("x + 1")
+
+    @pytest.mark.parametrize("expr,message", [
+        ("True or [1,2]", "Unsupported expression type: List"),
+        ("1 or x", "Unknown constant or variable: x"),
+        ("0 and open(1)", "Unknown or unsafe function: open"),
+        ("1 or 2 & 3", "Unsupported binary operator: BitAnd"),
+        ("0 and 1 < 2 < 3", "Chained comparisons not supported"),
+        ("1 / 0 + foo", "Unknown constant or variable: foo"),
+    ])
+    def test_unsupported_parts_rejected_upfront(self, evaluate, expr, message):
+        """Test that unsupported parts raise even where evaluation would skip them."""
+        with pytest.raises(ValueError, match=message):
+            evaluate(expr)
+
+    def test_boolean_operators_short_circuit(self, evaluate):
+        """Test that and/or stop evaluating once the result is known."""
+        assert evaluate("0 and 1 / 0") == 0
+        assert evaluate("2 or 1 / 0") == 2
+        assert evaluate("1 and 2 and 0 and 5") == 0
+        assert evaluate("0 or 0 or 3") == 3
+        with pytest.raises(ValueError):
+            evaluate("1 and 1 / 0")
@@ -1,10 +1,15 @@
 """Unit tests for SpreadsheetWidget additional functionality."""
 
+import os
 import pytest
 import json
+import sqlite3
+import threading
 from unittest.mock import Mock, MagicMock, patch
 from pathlib import Path
+from types import MappingProxyType
 
+from spark.database import Database
 from spark.spreadsheet_widget import (
     FormulaEngine,
     SafeExpressionEvaluator,
@@ -12,19 +17,88 @@ from spark.spreadsheet_widget import (
 )
 
 
+# One numeric sheet for the edge-case tests that only read cells, one row per
+# scenario. Read-only so the shared engine can't leak changes between tests.
+_GRID_CELLS = MappingProxyType({
+    "A1": "1", "B1": "2", "C1": "3", "D1": "4",
+    "A2": "4", "B2": "5", "C2": "6",
+    "A3": "10", "B3": "20",
+    "A4": "10", "B4": "5", "C4": "2",
+    "A5": "5", "B5": "3", "C5": "2",
+})
+
+
+# 100-cell sheet as saved JSON, for the large spreadsheet round trip
+_LARGE_SHEET_JSON = json.dumps({f"A{i}": str(i) for i in range(100)})
+
+
+@pytest.fixture(scope="class")
+def grid_engine():
+    """One FormulaEngine over _GRID_CELLS, shared by the read-only tests."""
+    return FormulaEngine(_GRID_CELLS)
+
+
 class TestFormulaEngineEdgeCases:
     """Additional test cases for FormulaEngine edge cases."""
 
-    def test_column_index_conversion(self):
-        """Test multi-column range with column index conversion."""
-        cells = {
-            "A1": "1", "B1": "2", "C1": "3",
-            "A2": "4", "B2": "5", "C2": "6",
-        }
-        engine = FormulaEngine(cells)
-        # Test multi-column range A1:C2 = 1+2+3+4+5+6 = 21
-        result = engine.evaluate("=SUM(A1:C2)")
-        assert result == 21
+    @pytest.mark.parametrize("formula,expected", [
+        # Multi-column range A1:C2 = 1+2+3+4+5+6
+        ("=SUM(A1:C2)", 21),
+        # Single-row range A1:D1 = 1+2+3+4
+        ("=SUM(A1:D1)", 10),
+        # Multiple operators: 10 + 5 * 2 - 3
+        ("=A4+B4*C4-3", 17.0),
+        # Nested parentheses: ((5+3)*2) + ((5-3)/2)
+        ("=((A5+B5)*C5)+((A5-B5)/C5)", 17.0),
+    ])
+    def test_grid_formulas(self, grid_engine, formula, expected):
+        """Test ranges and operator precedence against the shared grid."""
+        assert grid_engine.evaluate(formula) == expected
+
+    @pytest.mark.parametrize("formula,expected", [
+        ("=A3<B3", True),
+        ("=A3>B3", False),
+        ("=A3<=10", True),
+        ("=B3>=20", True),
+    ])
+    def test_comparison_with_cell_references(self, grid_engine, formula, expected):
+        """Test comparison operators with cell references."""
+        assert grid_engine.evaluate(formula) is expected
+
+    @pytest.mark.parametrize("cells,formula,expected", [
+        # SUM/AVERAGE of a single value
+        ({"A1": "42"}, "=SUM(A1)", 42),
+        ({"A1": "42"}, "=AVERAGE(A1)", 42),
+        # Literal numbers and decimals
+        ({}, "=3.14*2", pytest.approx(6.28)),
+        ({}, "=100/3", pytest.approx(33.333, rel=0.001)),
+    ])
+    def test_formula_values(self, cells, formula, expected):
+        """Test single-formula results."""
+        assert FormulaEngine(cells).evaluate(formula) == expected
+
+    @pytest.mark.parametrize("cells,formula,expected", [
+        ({}, "=AND(True,True)", True),
+        ({}, "=OR(False,False)", False),
+        ({}, "=NOT(True)", False),
+        ({}, "=NOT(False)", True),
+        # Equality normalization doesn't affect !=, <=, >=
+        ({"A1": "10"}, "=A1!=5", True),
+        ({"A1": "10"}, "=A1<=10", True),
+        ({"A1": "10"}, "=A1>=10", True),
+    ])
+    def test_boolean_results(self, cells, formula, expected):
+        """Test boolean functions and comparison operators."""
+        assert FormulaEngine(cells).evaluate(formula) is expected
+
+    def test_parse_cell_ref(self):
+        """Test saved cell names map to zero-based row and column."""
+        parse = SpreadsheetWidget.parse_cell_ref
+        assert parse(Mock(), "A1") == (0, 0)
+        assert parse(Mock(), "Z3") == (2, 25)
+        assert parse(Mock(), "AA10") == (9, 26)
+        assert parse(Mock(), "a1") == (0, 0)
+        assert parse(Mock(), "12") == (0, 0)
 
     def test_range_with_formulas(self):
         """Test cell ranges containing formulas."""
@@ -111,64 +185,6 @@ class TestFormulaEngineEdgeCases:
         result = engine.evaluate("=DATE(invalid)")
         assert "#ERROR" in result
 
-    def test_range_expansion_single_row(self):
-        """Test range expansion for a single row."""
-        cells = {
-            "A1": "1", "B1": "2", "C1": "3", "D1": "4"
-        }
-        engine = FormulaEngine(cells)
-        result = engine.evaluate("=SUM(A1:D1)")
-        assert result == 10
-
-    def test_comparison_with_cell_references(self):
-        """Test comparison operators with cell references."""
-        cells = {
-            "A1": "10",
-            "B1": "20",
-        }
-        engine = FormulaEngine(cells)
-
-        assert engine.evaluate("=A1<B1") is True
-        assert engine.evaluate("=A1>B1") is False
-        assert engine.evaluate("=A1<=10") is True
-        assert engine.evaluate("=B1>=20") is True
-
-    def test_formula_with_multiple_operators(self):
-        """Test formulas with multiple different operators."""
-        cells = {
-            "A1": "10",
-            "B1": "5",
-            "C1": "2",
-        }
-        engine = FormulaEngine(cells)
-        # 10 + 5 * 2 - 3 = 10 + 10 - 3 = 17
-        result = engine.evaluate("=A1+B1*C1-3")
-        assert result == 17.0
-
-    def test_nested_parentheses(self):
-        """Test deeply nested parentheses."""
-        cells = {
-            "A1": "5",
-            "B1": "3",
-            "C1": "2",
-        }
-        engine = FormulaEngine(cells)
-        result = engine.evaluate("=((A1+B1)*C1)+((A1-B1)/C1)")
-        # ((5+3)*2) + ((5-3)/2) = (8*2) + (2/2) = 16 + 1 = 17
-        assert result == 17.0
-
-    def test_sum_with_single_value(self):
-        """Test SUM with a single value."""
-        cells = {"A1": "42"}
-        engine = FormulaEngine(cells)
-        assert engine.evaluate("=SUM(A1)") == 42
-
-    def test_average_with_single_value(self):
-        """Test AVERAGE with a single value."""
-        cells = {"A1": "42"}
-        engine = FormulaEngine(cells)
-        assert engine.evaluate("=AVERAGE(A1)") == 42
-
     def test_if_condition_evaluation_error(self):
         """Test IF function when condition evaluation fails."""
         cells = {}
@@ -178,25 +194,6 @@ class TestFormulaEngineEdgeCases:
         # Should return false value when condition fails
         assert result == 200
 
-    def test_boolean_and_function(self):
-        """Test AND boolean function."""
-        cells = {}
-        engine = FormulaEngine(cells)
-        assert engine.evaluate("=AND(True,True)") is True
-
-    def test_boolean_or_function(self):
-        """Test OR boolean function."""
-        cells = {}
-        engine = FormulaEngine(cells)
-        assert engine.evaluate("=OR(False,False)") is False
-
-    def test_boolean_not_function(self):
-        """Test NOT boolean function."""
-        cells = {}
-        engine = FormulaEngine(cells)
-        assert engine.evaluate("=NOT(True)") is False
-        assert engine.evaluate("=NOT(False)") is True
-
     def test_cell_reference_case_sensitive(self):
         """Test that cell references are case-sensitive (uppercase only)."""
         cells = {"A1": "10", "B1": "20"}
@@ -217,23 +214,6 @@ class TestFormulaEngineEdgeCases:
         result = engine.evaluate("=SUM(A1:A5)")
         assert result == 0
 
-    def test_formula_with_literal_numbers(self):
-        """Test formulas with literal numbers and decimals."""
-        cells = {}
-        engine = FormulaEngine(cells)
-        assert engine.evaluate("=3.14*2") == pytest.approx(6.28)
-        assert engine.evaluate("=100/3") == pytest.approx(33.333, rel=0.001)
-
-    def test_normalize_equality_preserves_other_operators(self):
-        """Test that equality normalization doesn't affect other operators."""
-        cells = {"A1": "10"}
-        engine = FormulaEngine(cells)
-
-        # Should not affect !=, <=, >=
-        assert engine.evaluate("=A1!=5") is True
-        assert engine.evaluate("=A1<=10") is True
-        assert engine.evaluate("=A1>=10") is True
-
     def test_date_with_expression(self):
         """Test DATE function with complex expression."""
         cells = {}
@@ -279,13 +259,10 @@ class TestSafeExpressionEvaluatorEdgeCases:
         result = SafeExpressionEvaluator.evaluate("0.0000001 * 2")
         assert result == pytest.approx(0.0000002)
 
-    def test_multiple_boolean_operations(self):
+    @pytest.mark.parametrize("expr", ["True and True and True", "False or False or True"])
+    def test_multiple_boolean_operations(self, expr):
         """Test multiple boolean operations."""
-        result = SafeExpressionEvaluator.evaluate("True and True and True")
-        assert result is True
-
-        result = SafeExpressionEvaluator.evaluate("False or False or True")
-        assert result is True
+        assert SafeExpressionEvaluator.evaluate(expr) is True
 
     def test_mixed_int_and_float(self):
         """Test operations with mixed int and float."""
@@ -336,41 +313,35 @@ class TestSafeExpressionEvaluatorEdgeCases:
         assert result == -5
 
 
-class TestConfigEdgeCases:
-    """Additional edge cases for Config class."""
+@pytest.fixture(scope="class")
+def config(tmp_path_factory):
+    """One Config under a temporary HOME, shared by the lookup-only tests.
 
-    @pytest.fixture
-    def temp_home(self, tmp_path):
-        """Create a temporary home directory."""
-        return tmp_path / "test_home"
+    Config reads HOME only when it is constructed, so the variable is
+    restored straight away.
+    """
+    from spark.config import Config
 
-    def test_config_directory_permissions_error(self, temp_home, monkeypatch):
-        """Test config handles permission errors gracefully."""
-        from spark.config import Config
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("HOME", str(tmp_path_factory.mktemp("test_home")))
+        return Config()
 
-        monkeypatch.setenv("HOME", str(temp_home))
-        config = Config()
 
+class TestConfigEdgeCases:
+    """Additional edge cases for Config class."""
+
+    def test_config_directory_permissions_error(self, config):
+        """Test config handles permission errors gracefully."""
         # Config should still work even if chmod fails
         assert config.config_dir.exists()
 
-    def test_get_with_none_default(self, temp_home, monkeypatch):
+    def test_get_with_none_default(self, config):
         """Test get method returns None as default."""
-        from spark.config import Config
-
-        monkeypatch.setenv("HOME", str(temp_home))
-        config = Config()
-
         result = config.get("nonexistent_key")
         assert result is None
 
-    def test_images_dir_creation(self, temp_home, monkeypatch):
+    def test_images_dir_creation(self, config):
         """Test that images directory is created on first access."""
-        from spark.config import Config
-
-        monkeypatch.setenv("HOME", str(temp_home))
-        config = Config()
-
         images_dir = config.get_images_dir()
         assert images_dir.exists()
         assert images_dir.is_dir()
@@ -379,29 +350,19 @@ class TestConfigEdgeCases:
         images_dir2 = config.get_images_dir()
         assert images_dir == images_dir2
 
-    def test_backup_dir_creation(self, temp_home, monkeypatch):
+    def test_backup_dir_creation(self, config):
         """Test that backup directory is created on first access."""
-        from spark.config import Config
-
-        monkeypatch.setenv("HOME", str(temp_home))
-        config = Config()
-
         backup_dir = config.get_backup_dir()
         assert backup_dir.exists()
         assert backup_dir.is_dir()
 
 
 class TestDatabaseEdgeCases:
-    """Additional edge cases for Database class."""
+    """Additional edge cases for Database class.
 
-    @pytest.fixture
-    def db(self, tmp_path):
-        """Create a temporary database."""
-        from spark.database import Database
-        db_path = tmp_path / "test.db"
-        database = Database(db_path)
-        yield database
-        database.close()
+    db is the shared in-memory database from conftest, rolled back after
+    each test.
+    """
 
     def test_empty_content_fields(self, db):
         """Test database handles empty content gracefully."""
@@ -456,11 +417,9 @@ class TestDatabaseEdgeCases:
 
     def test_spreadsheet_with_large_json(self, db):
         """Test spreadsheet with large JSON data."""
-        large_data = json.dumps({f"A{i}": str(i) for i in range(100)})
-
-        sheet_id = db.add_spreadsheet("Large Sheet", large_data)
+        sheet_id = db.add_spreadsheet("Large Sheet", _LARGE_SHEET_JSON)
         sheet = db.get_spreadsheet(sheet_id)
-        assert sheet["data"] == large_data
+        assert sheet["data"] == _LARGE_SHEET_JSON
 
     def test_snippet_with_multiline_code(self, db):
         """Test snippet with multiline code."""
@@ -483,11 +442,99 @@ class TestDatabaseEdgeCases:
         """Test search with empty query."""
         db.add_note("Test", "Content")
 
-        # Empty search should match nothing or everything
-        results = db.search_notes("")
-        # Results depend on implementation, but shouldn't error
+        # Blank searches match nothing
+        assert db.search_notes("") == []
+        assert db.search_notes("   ") == []
+        assert db.search_snippets("") == []
 
     def test_get_snippets_by_nonexistent_language(self, db):
         """Test getting snippets for a language that doesn't exist."""
         results = db.get_snippets_by_language("NonexistentLanguage")
         assert len(results) == 0
+
+
+@pytest.fixture(scope="module")
+def qapp():
+    """QApplication for the widget tests, on the offscreen platform."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def sheet_widget(qapp, tmp_path):
+    """SpreadsheetWidget over a real database file, with one sheet open."""
+    database = Database(tmp_path / "spark.db")
+    database.add_spreadsheet("Sheet", json.dumps({"cells": {"A1": "1"}}))
+    widget = SpreadsheetWidget(database, {"autosave_enabled": False})
+    widget.on_sheet_selected(widget.sheet_list.item(0))
+    yield widget
+    widget.wait_for_pending_saves()
+    widget.close()
+    database.close()
+
+
+class TestBackgroundSave:
+    """Sheet saves go through the save pool and the real commit path."""
+
+    def test_save_visible_to_second_connection(self, sheet_widget):
+        """Test that a background save is committed where another connection can read it."""
+        sheet_widget.table.item(0, 0).setText("42")
+        assert sheet_widget.is_modified
+
+        sheet_widget.save_current_sheet()
+        sheet_widget.wait_for_pending_saves()
+
+        assert not sheet_widget.is_modified
+        reader = sqlite3.connect(sheet_widget.database.db_path)
+        try:
+            data, = reader.execute(
+                "SELECT data FROM spreadsheets WHERE id = ?", (sheet_widget.current_sheet_id,)
+            ).fetchone()
+        finally:
+            reader.close()
+        assert json.loads(data)["cells"]["A1"] == "42"
+
+    def test_failed_save_keeps_sheet_modified(self, sheet_widget):
+        """Test that a write failure leaves the sheet modified so it is saved again."""
+        database = sheet_widget.database
+        sheet_widget.table.item(0, 0).setText("42")
+
+        with patch.object(database, "update_spreadsheet", side_effect=sqlite3.OperationalError("disk I/O error")):
+            sheet_widget.save_current_sheet()
+            sheet_widget.wait_for_pending_saves()
+        assert sheet_widget.is_modified
+        assert json.loads(database.get_spreadsheet(sheet_widget.current_sheet_id)["data"])["cells"]["A1"] == "1"
+
+        # The retry writes the edit once the database is writable again
+        sheet_widget.save_current_sheet()
+        sheet_widget.wait_for_pending_saves()
+        assert not sheet_widget.is_modified
+        assert json.loads(database.get_spreadsheet(sheet_widget.current_sheet_id)["data"])["cells"]["A1"] == "42"
+
+    def test_back_to_back_saves_keep_last_edit(self, sheet_widget):
+        """Test that saving X, Y, then X again while writes are pending leaves X stored."""
+        database = sheet_widget.database
+        cell = sheet_widget.table.item(0, 0)
+        cell.setText("2")
+        sheet_widget.save_current_sheet()
+        sheet_widget.wait_for_pending_saves()
+
+        # Hold the worker on the next write so the other two saves queue behind it
+        release = threading.Event()
+        update = database.update_spreadsheet
+
+        def slow_update(*args):
+            release.wait(5)
+            update(*args)
+
+        with patch.object(database, "update_spreadsheet", side_effect=slow_update):
+            cell.setText("3")
+            sheet_widget.save_current_sheet()
+            cell.setText("2")
+            sheet_widget.save_current_sheet()
+            release.set()
+            sheet_widget.wait_for_pending_saves()
+
+        assert not sheet_widget.is_modified
+        assert json.loads(database.get_spreadsheet(sheet_widget.current_sheet_id)["data"])["cells"]["A1"] == "2"
@@ -1,7 +1,19 @@
 """Unit tests for themes module."""
 
+import re
 import pytest
-from spark.themes import THEMES, get_stylesheet
+from spark.themes import THEMES, get_stylesheet, _COLOR_KEYS, _validate_themes
+
+
+_WIDGET_TYPES = frozenset({
+    "QMainWindow", "QWidget", "QTreeWidget", "QListWidget",
+    "QTextEdit", "QPlainTextEdit", "QLineEdit", "QPushButton",
+    "QTabWidget", "QTabBar", "QMenuBar", "QMenu", "QTableWidget",
+    "QHeaderView", "QComboBox", "QStatusBar", "QScrollBar",
+})
+# Finds every widget type in one pass over the stylesheet; the word
+# boundaries stop "QMenu" matching the start of "QMenuBar"
+_WIDGET_TYPE_RE = re.compile(r"\b(?:%s)\b" % "|".join(sorted(_WIDGET_TYPES)))
 
 
 class TestThemes:
@@ -14,25 +26,28 @@ class TestThemes:
             assert theme_name in THEMES
 
     def test_theme_structure(self):
-        """Test that each theme has all required color keys."""
-        required_keys = [
+        """Test the color keys every theme is checked for at import."""
+        assert set(_COLOR_KEYS) == {
             "background", "foreground", "accent", "border", "hover",
             "selected", "editor_bg", "editor_fg", "tree_bg"
-        ]
-
-        for theme_name, theme_data in THEMES.items():
-            for key in required_keys:
-                assert key in theme_data, f"Theme {theme_name} missing key {key}"
-
-    def test_theme_colors_are_hex(self):
-        """Test that all theme colors are hex codes."""
-        for theme_name, theme_data in THEMES.items():
-            for color_key, color_value in theme_data.items():
-                assert isinstance(color_value, str)
-                assert color_value.startswith("#"), \
-                    f"Color {color_key} in theme {theme_name} should start with #"
-                assert len(color_value) == 7, \
-                    f"Color {color_key} in theme {theme_name} should be 7 chars"
+        }
+        # THEMES itself passed this check when spark.themes was imported
+        _validate_themes(THEMES)
+
+    @pytest.mark.parametrize("change", [
+        {"accent": None},          # missing key
+        {"extra": "#000000"},      # unexpected key
+        {"border": "cccccc"},      # no #
+        {"hover": "#fff"},         # short form
+        {"selected": "#cce8fg"},   # not hex
+        {"tree_bg": 0xf5f5f5},     # not a string
+    ])
+    def test_invalid_theme_rejected(self, change):
+        """Test that a theme with missing, extra or malformed colors is rejected."""
+        colors = dict(THEMES["Light"], **change)
+        colors = {key: value for key, value in colors.items() if value is not None}
+        with pytest.raises(ValueError):
+            _validate_themes({"Broken": colors})
 
     def test_light_theme_colors(self):
         """Test Light theme has light colors."""
@@ -82,20 +97,39 @@ class TestThemes:
             assert isinstance(stylesheet, str)
             assert len(stylesheet) > 0
             assert "QMainWindow" in stylesheet
+            for key, color in THEMES[theme_name].items():
+                assert "%(" + key + ")s" not in stylesheet
+                assert color in stylesheet
+
+    def test_get_stylesheet_cached(self):
+        """Test that repeated calls reuse the generated stylesheet."""
+        get_stylesheet.cache_clear()
+        first = get_stylesheet("Dark", "Arial", 12)
+        assert get_stylesheet("Dark", "Arial", 12) is first
+        assert get_stylesheet.cache_info().hits == 1
+        assert get_stylesheet("Dark", "Arial", 14) != first
+
+    def test_get_stylesheet_include_subset(self):
+        """Test that include limits the stylesheet to the named widget classes."""
+        stylesheet = get_stylesheet("Dark", "Arial", 12, include=frozenset({"QTreeWidget", "QComboBox"}))
+
+        assert set(_WIDGET_TYPE_RE.findall(stylesheet)) == {"QTreeWidget", "QComboBox"}
+        assert "QTreeWidget::item:selected" in stylesheet
+        assert "background-color: #252526" in stylesheet  # Dark tree_bg
+        assert "font-family" not in stylesheet
+
+    def test_get_stylesheet_include_everything(self):
+        """Test that including every widget class gives the full stylesheet."""
+        for theme_name in list(THEMES) + ["NonexistentTheme"]:
+            assert get_stylesheet(theme_name, "Arial", 12, include=_WIDGET_TYPES) == \
+                get_stylesheet(theme_name, "Arial", 12)
 
     def test_stylesheet_contains_all_widget_types(self):
         """Test that stylesheet includes all expected widget types."""
         stylesheet = get_stylesheet("Light", "Arial", 12)
 
-        widget_types = [
-            "QMainWindow", "QWidget", "QTreeWidget", "QListWidget",
-            "QTextEdit", "QPlainTextEdit", "QLineEdit", "QPushButton",
-            "QTabWidget", "QTabBar", "QMenuBar", "QMenu", "QTableWidget",
-            "QHeaderView", "QComboBox", "QStatusBar", "QScrollBar"
-        ]
-
-        for widget_type in widget_types:
-            assert widget_type in stylesheet
+        found = set(_WIDGET_TYPE_RE.findall(stylesheet))
+        assert found >= _WIDGET_TYPES, f"Missing widget types: {_WIDGET_TYPES - found}"
 
     def test_stylesheet_hover_states(self):
         """Test that stylesheet includes hover states."""
@@ -144,13 +178,12 @@ class TestThemes:
         assert gruvbox["foreground"] == "#ebdbb2"
         assert gruvbox["accent"] == "#fe8019"
 
-    def test_theme_consistency(self):
-        """Test that themes have consistent structure."""
-        first_theme_keys = set(THEMES["Light"].keys())
-
-        for theme_name, theme_data in THEMES.items():
-            assert set(theme_data.keys()) == first_theme_keys, \
-                f"Theme {theme_name} has inconsistent keys"
+    def test_themes_are_read_only(self):
+        """Test that themes can't be changed after their stylesheets are built."""
+        with pytest.raises(TypeError):
+            THEMES["Custom"] = dict(THEMES["Light"])
+        with pytest.raises(TypeError):
+            THEMES["Light"]["background"] = "#000000"
 
     def test_stylesheet_border_properties(self):
         """Test that stylesheet includes border properties."""
@@ -1,6 +1,11 @@
 """Theme definitions for SPARK Personal."""
 
-THEMES = {
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import FrozenSet, Optional
+
+_THEME_COLORS = {
     "Light": {
         "background": "#ffffff",
         "foreground": "#000000",
@@ -58,172 +63,239 @@ THEMES = {
     },
 }
 
+# Colors every theme must define, and nothing else
+_COLOR_KEYS = (
+    "background", "foreground", "accent", "border", "hover",
+    "selected", "editor_bg", "editor_fg", "tree_bg",
+)
+_HEX_COLOR_RE = re.compile(r"#[0-9a-fA-F]{6}")
 
-def get_stylesheet(theme_name: str, font_family: str, font_size: int) -> str:
-    """Generate Qt stylesheet for the given theme."""
-    theme = THEMES.get(theme_name, THEMES["Light"])
 
-    return f"""
-    QMainWindow, QWidget {{
-        background-color: {theme['background']};
-        color: {theme['foreground']};
-        font-family: {font_family};
-        font-size: {font_size}pt;
-    }}
-
-    QTreeWidget {{
-        background-color: {theme['tree_bg']};
-        color: {theme['foreground']};
-        border: 1px solid {theme['border']};
+def _validate_themes(themes) -> None:
+    """Check that each theme defines exactly _COLOR_KEYS, all as #rrggbb colors.
+
+    Run once at import, so a broken theme fails there with a clear message
+    instead of as a KeyError or a bad stylesheet later on.
+    """
+    required = set(_COLOR_KEYS)
+    for name, colors in themes.items():
+        if set(colors) != required:
+            missing = sorted(required - set(colors))
+            extra = sorted(set(colors) - required)
+            raise ValueError(f"Theme {name!r} colors don't match: missing {missing}, unexpected {extra}")
+        for key, color in colors.items():
+            if not (isinstance(color, str) and _HEX_COLOR_RE.fullmatch(color)):
+                raise ValueError(f"Theme {name!r} color {key!r} is not a #rrggbb hex code: {color!r}")
+
+
+_validate_themes(_THEME_COLORS)
+
+# Read-only, since each theme's stylesheet is filled in from these once at
+# import; an edited color would never reach get_stylesheet
+THEMES = MappingProxyType({
+    name: MappingProxyType(colors) for name, colors in _THEME_COLORS.items()
+})
+
+
+# Qt stylesheet with %-style fields for the theme colors and the font
+_STYLESHEET_TEMPLATE = """
+    QMainWindow, QWidget {
+        background-color: %(background)s;
+        color: %(foreground)s;
+        font-family: %(font_family)s;
+        font-size: %(font_size)spt;
+    }
+
+    QTreeWidget {
+        background-color: %(tree_bg)s;
+        color: %(foreground)s;
+        border: 1px solid %(border)s;
         outline: none;
-    }}
+    }
 
-    QTreeWidget::item:hover {{
-        background-color: {theme['hover']};
-    }}
+    QTreeWidget::item:hover {
+        background-color: %(hover)s;
+    }
 
-    QTreeWidget::item:selected {{
-        background-color: {theme['selected']};
-    }}
+    QTreeWidget::item:selected {
+        background-color: %(selected)s;
+    }
 
-    QListWidget {{
-        background-color: {theme['tree_bg']};
-        color: {theme['foreground']};
-        border: 1px solid {theme['border']};
+    QListWidget {
+        background-color: %(tree_bg)s;
+        color: %(foreground)s;
+        border: 1px solid %(border)s;
         outline: none;
-    }}
-
-    QListWidget::item:hover {{
-        background-color: {theme['hover']};
-    }}
-
-    QListWidget::item:selected {{
-        background-color: {theme['selected']};
-    }}
-
-    QTextEdit, QPlainTextEdit {{
-        background-color: {theme['editor_bg']};
-        color: {theme['editor_fg']};
-        border: 1px solid {theme['border']};
-        selection-background-color: {theme['selected']};
-    }}
-
-    QLineEdit {{
-        background-color: {theme['editor_bg']};
-        color: {theme['editor_fg']};
-        border: 1px solid {theme['border']};
+    }
+
+    QListWidget::item:hover {
+        background-color: %(hover)s;
+    }
+
+    QListWidget::item:selected {
+        background-color: %(selected)s;
+    }
+
+    QTextEdit, QPlainTextEdit {
+        background-color: %(editor_bg)s;
+        color: %(editor_fg)s;
+        border: 1px solid %(border)s;
+        selection-background-color: %(selected)s;
+    }
+
+    QLineEdit {
+        background-color: %(editor_bg)s;
+        color: %(editor_fg)s;
+        border: 1px solid %(border)s;
         padding: 4px;
-    }}
+    }
 
-    QPushButton {{
-        background-color: {theme['accent']};
+    QPushButton {
+        background-color: %(accent)s;
         color: white;
         border: none;
         padding: 6px 12px;
         border-radius: 3px;
-    }}
+    }
 
-    QPushButton:hover {{
-        background-color: {theme['foreground']};
-    }}
+    QPushButton:hover {
+        background-color: %(foreground)s;
+    }
 
-    QPushButton:pressed {{
-        background-color: {theme['border']};
-    }}
+    QPushButton:pressed {
+        background-color: %(border)s;
+    }
 
-    QTabWidget::pane {{
-        border: 1px solid {theme['border']};
-        background-color: {theme['background']};
-    }}
+    QTabWidget::pane {
+        border: 1px solid %(border)s;
+        background-color: %(background)s;
+    }
 
-    QTabBar::tab {{
-        background-color: {theme['tree_bg']};
-        color: {theme['foreground']};
+    QTabBar::tab {
+        background-color: %(tree_bg)s;
+        color: %(foreground)s;
         padding: 8px 16px;
-        border: 1px solid {theme['border']};
+        border: 1px solid %(border)s;
         border-bottom: none;
-    }}
-
-    QTabBar::tab:selected {{
-        background-color: {theme['background']};
-    }}
-
-    QTabBar::tab:hover {{
-        background-color: {theme['hover']};
-    }}
-
-    QMenuBar {{
-        background-color: {theme['background']};
-        color: {theme['foreground']};
-    }}
-
-    QMenuBar::item:selected {{
-        background-color: {theme['hover']};
-    }}
-
-    QMenu {{
-        background-color: {theme['background']};
-        color: {theme['foreground']};
-        border: 1px solid {theme['border']};
-    }}
-
-    QMenu::item:selected {{
-        background-color: {theme['selected']};
-    }}
-
-    QTableWidget {{
-        background-color: {theme['editor_bg']};
-        color: {theme['editor_fg']};
-        gridline-color: {theme['border']};
-        border: 1px solid {theme['border']};
-    }}
-
-    QHeaderView::section {{
-        background-color: {theme['tree_bg']};
-        color: {theme['foreground']};
-        border: 1px solid {theme['border']};
+    }
+
+    QTabBar::tab:selected {
+        background-color: %(background)s;
+    }
+
+    QTabBar::tab:hover {
+        background-color: %(hover)s;
+    }
+
+    QMenuBar {
+        background-color: %(background)s;
+        color: %(foreground)s;
+    }
+
+    QMenuBar::item:selected {
+        background-color: %(hover)s;
+    }
+
+    QMenu {
+        background-color: %(background)s;
+        color: %(foreground)s;
+        border: 1px solid %(border)s;
+    }
+
+    QMenu::item:selected {
+        background-color: %(selected)s;
+    }
+
+    QTableWidget {
+        background-color: %(editor_bg)s;
+        color: %(editor_fg)s;
+        gridline-color: %(border)s;
+        border: 1px solid %(border)s;
+    }
+
+    QHeaderView::section {
+        background-color: %(tree_bg)s;
+        color: %(foreground)s;
+        border: 1px solid %(border)s;
         padding: 4px;
-    }}
+    }
 
-    QComboBox {{
-        background-color: {theme['editor_bg']};
-        color: {theme['editor_fg']};
-        border: 1px solid {theme['border']};
+    QComboBox {
+        background-color: %(editor_bg)s;
+        color: %(editor_fg)s;
+        border: 1px solid %(border)s;
         padding: 4px;
-    }}
+    }
 
-    QComboBox::drop-down {{
+    QComboBox::drop-down {
         border: none;
-    }}
+    }
 
-    QComboBox QAbstractItemView {{
-        background-color: {theme['background']};
-        color: {theme['foreground']};
-        selection-background-color: {theme['selected']};
-    }}
+    QComboBox QAbstractItemView {
+        background-color: %(background)s;
+        color: %(foreground)s;
+        selection-background-color: %(selected)s;
+    }
 
-    QStatusBar {{
-        background-color: {theme['tree_bg']};
-        color: {theme['foreground']};
-    }}
+    QStatusBar {
+        background-color: %(tree_bg)s;
+        color: %(foreground)s;
+    }
 
-    QScrollBar:vertical {{
-        background-color: {theme['background']};
+    QScrollBar:vertical {
+        background-color: %(background)s;
         width: 12px;
-    }}
+    }
 
-    QScrollBar::handle:vertical {{
-        background-color: {theme['border']};
+    QScrollBar::handle:vertical {
+        background-color: %(border)s;
         border-radius: 6px;
-    }}
+    }
 
-    QScrollBar:horizontal {{
-        background-color: {theme['background']};
+    QScrollBar:horizontal {
+        background-color: %(background)s;
         height: 12px;
-    }}
+    }
 
-    QScrollBar::handle:horizontal {{
-        background-color: {theme['border']};
+    QScrollBar::handle:horizontal {
+        background-color: %(border)s;
         border-radius: 6px;
-    }}
+    }
     """
+
+
+# The colors never change at runtime, so each theme's stylesheet is filled
+# in once here. The font fields become positional "%s" placeholders, leaving
+# get_stylesheet a single "stylesheet % (font_family, font_size)".
+_THEME_STYLESHEETS = {
+    name: _STYLESHEET_TEMPLATE % dict(theme, font_family="%s", font_size="%s")
+    for name, theme in THEMES.items()
+}
+
+# The template's rules in order, each with the widget classes its selector
+# names (e.g. "QComboBox QAbstractItemView"), for building partial stylesheets
+_STYLESHEET_RULES = tuple(
+    (frozenset(re.findall(r"\bQ\w+", rule[:rule.index("{")])), rule)
+    for rule in re.findall(r"\s*[^{}]*\{[^{}]*\}", _STYLESHEET_TEMPLATE)
+)
+# Whitespace after the last rule
+_STYLESHEET_TAIL = _STYLESHEET_TEMPLATE[len("".join(rule for _, rule in _STYLESHEET_RULES)):]
+
+
+# The window only ever uses a few theme/font combinations, so switching back
+# to one reuses its stylesheet. get_stylesheet.cache_clear() drops them all.
+@lru_cache(maxsize=16)
+def get_stylesheet(theme_name: str, font_family: str, font_size: int, *,
+                   include: Optional[FrozenSet[str]] = None) -> str:
+    """Generate Qt stylesheet for the given theme.
+
+    With include, only the rules whose selectors name one of those widget
+    classes are emitted, e.g. include=frozenset({"QTreeWidget", "QTextEdit"}).
+    """
+    if include is None:
+        stylesheet = _THEME_STYLESHEETS.get(theme_name, _THEME_STYLESHEETS["Light"])
+        return stylesheet % (font_family, font_size)
+
+    theme = THEMES.get(theme_name, THEMES["Light"])
+    template = "".join(rule for classes, rule in _STYLESHEET_RULES if classes & include)
+    return (template + _STYLESHEET_TAIL) % dict(theme, font_family=font_family, font_size=font_size)
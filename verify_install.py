@@ -1,71 +1,99 @@
 #!/usr/bin/env python3
 """Verification script for SPARK Personal installation."""
 
+import os
 import sys
-import importlib
+
+# Oldest supported Python, as in setup.py's python_requires
+MIN_PYTHON = (3, 8)
+
+# (module to find, package name to report) for each runtime dependency
+_DEPENDENCIES = (
+    ('PyQt6', 'PyQt6'),
+    ('yaml', 'PyYAML'),
+    ('pygments', 'Pygments'),
+    ('markdown', 'Markdown'),
+)
+
+# Project files checked by check_project_structure, relative to the project root
+_FILES_TO_CHECK = (
+    'spark/__init__.py',
+    'spark/main.py',
+    'spark/config.py',
+    'spark/database.py',
+    'spark/main_window.py',
+    'spark/notes_widget.py',
+    'spark/spreadsheet_widget.py',
+    'spark/snippets_widget.py',
+    'spark/backup_manager.py',
+    'spark/themes.py',
+    'spark/demo_data.py',
+    'requirements.txt',
+    'setup.py',
+    'README.md',
+)
 
 
 def check_python_version():
     """Check if Python version is 3.8 or higher."""
     version = sys.version_info
-    if version.major < 3 or (version.major == 3 and version.minor < 8):
-        print(f"❌ Python 3.8+ required, found {version.major}.{version.minor}.{version.micro}")
+    found = f"{version.major}.{version.minor}.{version.micro}"
+    if version < MIN_PYTHON:
+        print(f"❌ Python {'.'.join(map(str, MIN_PYTHON))}+ required, found {found}")
         return False
-    print(f"✅ Python {version.major}.{version.minor}.{version.micro}")
+    print(f"✅ Python {found}")
     return True
 
 
 def check_dependencies():
     """Check if all required dependencies are installed."""
-    dependencies = {
-        'PyQt6': 'PyQt6',
-        'yaml': 'PyYAML',
-        'pygments': 'Pygments',
-        'markdown': 'Markdown',
-    }
+    # Neither lookup runs any package code: find_spec only locates the
+    # module, and versions come from the installed package metadata.
+    # Importing the packages themselves (PyQt6 especially) is slow.
+    from importlib.metadata import version, PackageNotFoundError
+    from importlib.util import find_spec
 
+    lines = []
     all_installed = True
-    for module, package in dependencies.items():
-        try:
-            mod = importlib.import_module(module)
-            version = getattr(mod, '__version__', 'unknown')
-            print(f"✅ {package}: {version}")
-        except ImportError:
-            print(f"❌ {package}: NOT INSTALLED")
+    for module, package in _DEPENDENCIES:
+        if find_spec(module) is None:
+            lines.append(f"❌ {package}: NOT INSTALLED")
             all_installed = False
-
+            continue
+        try:
+            package_version = version(package)
+        except PackageNotFoundError:
+            # Importable but without metadata, e.g. copied onto sys.path
+            package_version = 'unknown'
+        lines.append(f"✅ {package}: {package_version}")
+
+    # One write for the whole report instead of one per line
+    print("\n".join(lines))
     return all_installed
 
 
 def check_project_structure():
     """Check if all required project files exist."""
-    from pathlib import Path
-
-    files_to_check = [
-        'spark/__init__.py',
-        'spark/main.py',
-        'spark/config.py',
-        'spark/database.py',
-        'spark/main_window.py',
-        'spark/notes_widget.py',
-        'spark/spreadsheet_widget.py',
-        'spark/snippets_widget.py',
-        'spark/backup_manager.py',
-        'spark/themes.py',
-        'spark/demo_data.py',
-        'requirements.txt',
-        'setup.py',
-        'README.md',
-    ]
-
+    # List each directory once rather than stat() every file
+    listings = {}
+    lines = []
     all_exist = True
-    for file in files_to_check:
-        if Path(file).exists():
-            print(f"✅ {file}")
+    for file in _FILES_TO_CHECK:
+        directory, _, name = file.rpartition('/')
+        directory = directory or '.'
+        if directory not in listings:
+            try:
+                with os.scandir(directory) as entries:
+                    listings[directory] = {entry.name for entry in entries}
+            except OSError:
+                listings[directory] = set()
+        if name in listings[directory]:
+            lines.append(f"✅ {file}")
         else:
-            print(f"❌ {file}: NOT FOUND")
+            lines.append(f"❌ {file}: NOT FOUND")
             all_exist = False
 
+    print("\n".join(lines))
     return all_exist
 
 